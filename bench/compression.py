@@ -0,0 +1,87 @@
+"""
+Benchmark: memory saved by compressing cached HTML, against the cost of
+compressing it once per render and decompressing it on every read.
+
+Renders the install/articles fixtures and a large synthetic document, then
+encodes each with the cache codecs at several zlib levels:
+
+> python -m bench.compression --runs 20 --parts 250
+
+document      codec      raw KB  stored KB  saved  encode ms  decode ms
+help          zlib-6      153.5       27.2    82%       4.73       0.70
+synthetic     zlib-6     1747.1      162.8    91%      37.95       4.48
+...
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from redis.exceptions import ConnectionError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.documents import fixtures, synthetic_document  # noqa: E402
+from lib.compression import Codec, ZlibCodec  # noqa: E402
+from lib.compression import decode_value, encode_value  # noqa: E402
+from lib.wiki.settings import Settings  # noqa: E402
+from lib.wiki.wiki import Wiki  # noqa: E402
+
+CODECS = {
+    "none": Codec(),
+    "zlib-1": ZlibCodec(level=1),
+    "zlib-6": ZlibCodec(level=6),  # <-- The default
+    "zlib-9": ZlibCodec(level=9),
+}
+
+
+def render(name: str, parts: dict) -> bytes:
+    wiki = Wiki(Settings({"config:user": "bench", "config:document": name}))
+    return wiki.process("bench", name, dict(parts)).encode("utf-8")
+
+
+def median_ms(function, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark cache compression.")
+    parser.add_argument("--runs", type=int, default=20, help="timed runs per codec")
+    parser.add_argument("--parts", type=int, default=250, help="synthetic doc parts")
+    args = parser.parse_args(argv)
+
+    documents = fixtures()
+    documents["synthetic"] = synthetic_document(parts=args.parts)
+
+    print(
+        f"{'document':<13} {'codec':<8} {'raw KB':>8} {'stored KB':>10} "
+        f"{'saved':>6} {'encode ms':>10} {'decode ms':>10}"
+    )
+    for name, parts in documents.items():
+        try:
+            html = render(name, parts)
+        except ConnectionError:  # <-- e.g. ARTICLES blocks need Redis
+            print(f"{name:<13} skipped (needs Redis)")
+            continue
+        for label, codec in CODECS.items():
+            value = encode_value(codec, html)
+            assert decode_value(value) == html
+            encode = median_ms(lambda: encode_value(codec, html), args.runs)
+            decode = median_ms(lambda: decode_value(value), args.runs)
+            saved = 1 - len(value) / len(html)
+            print(
+                f"{name:<13} {label:<8} {len(html) / 1024:>8.1f} "
+                f"{len(value) / 1024:>10.1f} {saved:>6.0%} "
+                f"{encode:>10.2f} {decode:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark documents: the install/articles fixtures, and a generator for large
+synthetic documents.
+
+> parts = synthetic_document(parts=250)
+"""
+
+import contextlib
+import io
+import os
+
+from random import Random
+
+from lib.storage import load_dir
+
+ARTICLES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "install", "articles"
+)
+
+WORDS = (
+    "the argument of this chapter is that long texts need structure and "
+    "readers need clear signposts through evidence claims and conclusions"
+).split()
+
+
+def fixtures() -> dict:
+    """
+    Return {name: parts} for each document in install/articles.
+    """
+    documents = {}
+    for name in sorted(os.listdir(ARTICLES_DIR)):
+        with contextlib.redirect_stdout(io.StringIO()):  # <-- Quiet load_dir()
+            documents[name] = load_dir(os.path.join(ARTICLES_DIR, name))
+    return documents
+
+
+def synthetic_document(
+    parts: int = 250,
+    paragraphs: int = 4,
+    footnotes: int = 8,
+    citations: int = 4,
+    cross_references: int = 4,
+    authors: int = 50,
+    seed: int = 1,
+) -> dict:
+    """
+    Generate a document with an index, numbered parts (with footnotes,
+    citations and cross-references spread through their paragraphs), and a
+    bibliography. The same arguments always give the same document, which
+    must keep within the wiki's 300-part limit (index and biblio included).
+    """
+    random = Random(seed)
+    titles = ["Part %d" % (_ + 1) for _ in range(parts)]
+
+    index = ["Synthetic Document", "", "= Generated for benchmarks", ""]
+    index += ["$ AUTHOR = Bench Mark", "$ DATE = 1 January 2020", ""]
+    for number, title in enumerate(titles):
+        index.append(("- " if number % 4 == 0 else "- - ") + title)
+    document = {"index": "\n".join(index)}
+
+    for title in titles:
+        markers = ["^[note]"] * footnotes
+        markers += [
+            "~[Author%d 2000, p.%d]" % (random.randrange(authors), _ + 1)
+            for _ in range(citations)
+        ]
+        markers += ["@[%s]" % random.choice(titles) for _ in range(cross_references)]
+        random.shuffle(markers)
+
+        text = [title, ""]
+        for number in range(paragraphs):
+            sentence = " ".join(random.choice(WORDS) for _ in range(60))
+            these = markers[number::paragraphs]
+            words = sentence.split(" ")
+            for marker in these:
+                words.insert(random.randrange(len(words)), marker)
+            words[0] = words[0].capitalize()
+            text += [" ".join(words) + ".", ""]
+        text += ["^ Footnote %d for %s." % (_ + 1, title) for _ in range(footnotes)]
+        document[slug_for(title)] = "\n".join(text)
+
+    document["biblio"] = "\n".join(
+        "Author%d, Name. 2000. Title Number %d. City: Publisher." % (_, _)
+        for _ in range(authors)
+    )
+    return document
+
+
+def slug_for(title: str) -> str:
+    return title.lower().replace(" ", "-")
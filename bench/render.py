@@ -0,0 +1,143 @@
+"""
+Benchmark: render the install/articles fixtures and a large synthetic
+document, with a per-stage breakdown of Wiki.process().
+
+> python -m bench.render --runs 5 --parts 250 --memory --output bench.json
+
+Prints (or writes) JSON, so results can be compared between releases:
+
+{
+    "version": "0.2.1",
+    "python": "3.11.7",
+    "documents": [
+        {
+            "name": "help",
+            "parts": 41,
+            "total_ms": 250.1,  # <-- median of runs
+            "stages": {"insert": {"ms": 20.3, "calls": 2, "allocated_kb": 512.0},
+                       ...},
+        },
+        ...
+    ]
+}
+
+Render caches are disabled, and memos cleared before each render, unless
+--warm is given, so each run renders every section from scratch. Documents
+that need Redis (e.g. the index fixture's article lists) are skipped if it is
+not running.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from redis.exceptions import ConnectionError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.documents import fixtures, synthetic_document  # noqa: E402
+from bench.stages import STAGES, Stages  # noqa: E402
+from lib.wiki.bible_references import REFERENCES_CACHE  # noqa: E402
+from lib.wiki.bibliography import citation_terms  # noqa: E402
+from lib.wiki.blocks import BLOCK_CACHE  # noqa: E402
+from lib.wiki.inline import process_memo  # noqa: E402
+from lib.wiki.settings import Settings  # noqa: E402
+from lib.wiki.wiki import DEMO_CACHE, SECTION_CACHE, Wiki  # noqa: E402
+
+CACHES = [SECTION_CACHE, BLOCK_CACHE, DEMO_CACHE, REFERENCES_CACHE]
+MEMOS = [process_memo, citation_terms]  # <-- functools.lru_cache
+
+VERSION_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "VERSION"
+)
+
+
+def render(name: str, parts: dict, warm: bool = True) -> str:
+    if not warm:
+        for memo in MEMOS:
+            memo.cache_clear()
+    wiki = Wiki(Settings({"config:user": "bench", "config:document": name}))
+    return wiki.process("bench", name, dict(parts))
+
+
+def benchmark(name: str, parts: dict, runs: int, memory: bool, warm: bool) -> dict:
+    """
+    Render a document `runs` times (after one untimed render), and return the
+    median total and stage times; allocations are measured in one extra run,
+    as tracing slows everything down.
+    """
+    render(name, parts, warm)
+    totals, reports = [], []
+    for _ in range(runs):
+        with Stages() as stages:
+            start = time.perf_counter()
+            render(name, parts, warm)
+            totals.append((time.perf_counter() - start) * 1000)
+        reports.append(stages.report())
+
+    result = {
+        "name": name,
+        "parts": len(parts),
+        "bytes": sum(len(_) for _ in parts.values()),
+        "runs": runs,
+        "total_ms": round(statistics.median(totals), 3),
+        "stages": {
+            stage: {
+                "ms": round(statistics.median(_[stage]["ms"] for _ in reports), 3),
+                "calls": reports[0][stage]["calls"],
+            }
+            for stage in STAGES
+        },
+    }
+    if memory:
+        with Stages(memory=True) as stages:
+            render(name, parts, warm)
+        for stage, report in stages.report().items():
+            result["stages"][stage]["allocated_kb"] = report["allocated_kb"]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Wiki.process().")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per document")
+    parser.add_argument("--parts", type=int, default=250, help="synthetic doc parts")
+    parser.add_argument("--memory", action="store_true", help="measure allocations")
+    parser.add_argument("--warm", action="store_true", help="keep render caches on")
+    parser.add_argument("--output", help="write JSON to this file")
+    args = parser.parse_args(argv)
+
+    for cache in CACHES:
+        cache.enabled = args.warm
+
+    documents = fixtures()
+    documents["synthetic"] = synthetic_document(parts=args.parts)
+
+    with open(VERSION_FILE) as file:
+        version = file.read().strip()
+    results = {
+        "version": version,
+        "python": platform.python_version(),
+        "warm": args.warm,
+        "documents": [],
+    }
+    for name, parts in documents.items():
+        try:
+            result = benchmark(name, parts, args.runs, args.memory, args.warm)
+        except ConnectionError as error:  # <-- e.g. ARTICLES blocks need Redis
+            result = {"name": name, "skipped": str(error)}
+        results["documents"].append(result)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Time the stages of Wiki.process() by wrapping the functions that do them.
+
+> with Stages(memory=True) as stages:
+>     wiki.process(user_slug, doc_slug, parts)
+> stages.report()
+
+Only the outermost stage is counted, so work done for nested documents (e.g.
+DEMO blocks, rendered while placeholders are replaced) counts towards the
+stage that triggered it, and the stages never overlap.
+"""
+
+import time
+import tracemalloc
+
+from collections import defaultdict
+from functools import wraps
+
+import lib.wiki.wiki
+
+from lib.wiki.blocks import BlockList
+
+STAGES = ["insert", "outline", "footnotes", "bibliography", "blocks", "replace"]
+
+
+class Stages:
+    """
+    Accumulate wall time, calls, and (optionally) memory allocated per stage.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.allocated = defaultdict(int)  # <-- Peak bytes above the start
+        self.active = False
+        self.patches = []
+
+    def wrap(self, stage: str, function):
+        @wraps(function)
+        def timed(*args, **kwargs):
+            if self.active:
+                return function(*args, **kwargs)
+            self.active = True
+            if self.memory:
+                tracemalloc.reset_peak()
+                start_bytes, _ = tracemalloc.get_traced_memory()
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - start
+                self.calls[stage] += 1
+                if self.memory:
+                    _, peak_bytes = tracemalloc.get_traced_memory()
+                    self.allocated[stage] += peak_bytes - start_bytes
+                self.active = False
+
+        return timed
+
+    def patch(self, owner, name: str, replacement):
+        self.patches.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def __enter__(self):
+        module = lib.wiki.wiki
+        insert = self.wrap("insert", module.pipe)
+        replace = self.wrap("replace", module.pipe)
+
+        def pipe(objects, method_name, parts):
+            if method_name == "insert":
+                return insert(objects, method_name, parts)
+            return replace(objects, method_name, parts)
+
+        self.patch(module, "pipe", pipe)
+        self.patch(module, "Outline", self.wrap("outline", module.Outline))
+        self.patch(module, "Footnotes", self.wrap("footnotes", module.Footnotes))
+        self.patch(module, "Bibliography", self.wrap("bibliography", module.Bibliography))
+        self.patch(BlockList, "html", self.wrap("blocks", BlockList.html))
+        if self.memory:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *_):
+        if self.memory:
+            tracemalloc.stop()
+        for owner, name, original in reversed(self.patches):
+            setattr(owner, name, original)
+        self.patches = []
+
+    def report(self) -> dict:
+        """
+        Return {stage: {"ms": ..., "calls": ..., "allocated_kb": ...}}.
+        """
+        report = {}
+        for stage in STAGES:
+            report[stage] = {
+                "ms": round(self.seconds[stage] * 1000, 3),
+                "calls": self.calls[stage],
+            }
+            if self.memory:
+                report[stage]["allocated_kb"] = round(self.allocated[stage] / 1024, 1)
+        return report
@@ -0,0 +1,80 @@
+"""
+Benchmark: per-render cost of compiling the wiki's Jinja fragments.
+
+Counts how often each registered template is rendered while processing the
+install/articles/help document, and how long each takes to compile, to
+estimate what compiling them once (rather than on every call) saves per
+render.
+
+> python -m bench.templates
+"""
+
+import os
+import sys
+
+from collections import Counter
+from timeit import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jinja2 import Environment  # noqa: E402
+
+import lib.wiki.helpers  # noqa: E402,F401
+import lib.wiki.index  # noqa: E402,F401
+
+from lib.storage import load_dir  # noqa: E402
+from lib.wiki.blocks import BLOCK_CACHE  # noqa: E402
+from lib.wiki.settings import Settings  # noqa: E402
+from lib.wiki.templates import SOURCES, TEMPLATES  # noqa: E402
+from lib.wiki.wiki import SECTION_CACHE, Wiki  # noqa: E402
+
+FIXTURE = "install/articles/help"
+REPEAT = 10
+
+
+def render(parts: dict) -> str:
+    wiki = Wiki(Settings({"config:user": "admin", "config:document": "help"}))
+    return wiki.process("admin", "help", dict(parts))
+
+
+def count_renders(parts: dict) -> Counter:
+    counts = Counter()
+    for name, template in TEMPLATES.items():
+        original = template.render
+
+        def counted(*args, _name=name, _original=original, **kwargs):
+            counts[_name] += 1
+            return _original(*args, **kwargs)
+
+        template.render = counted
+    try:
+        render(parts)
+    finally:
+        for template in TEMPLATES.values():
+            del template.render
+    return counts
+
+
+def compile_seconds(name: str) -> float:
+    env = Environment(autoescape=True)
+    return timeit(lambda: env.from_string(SOURCES[name]), number=REPEAT) / REPEAT
+
+
+def main():
+    SECTION_CACHE.enabled = False
+    BLOCK_CACHE.enabled = False
+    parts = load_dir(FIXTURE)
+    render_seconds = timeit(lambda: render(parts), number=REPEAT) / REPEAT
+    counts = count_renders(parts)
+    saving = 0.0
+    print(f"{'template':<20} {'renders':>8} {'compile ms':>11}")
+    for name in sorted(TEMPLATES):
+        seconds = compile_seconds(name)
+        saving += counts[name] * seconds
+        print(f"{name:<20} {counts[name]:>8} {seconds * 1000:>11.3f}")
+    print(f"render (registry):   {render_seconds * 1000:.1f} ms")
+    print(f"compiling per call:  {saving * 1000:.1f} ms more per render")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,8 +11,9 @@ import click
 
 from lib.data import Data, load_env_config
 from lib.ebook import write_epub
-from lib.document import Document
 from lib.fixtures import load_fixtures, save_fixtures
+from lib.jobs import run_epub_worker
+from lib.refresh import refresh_all
 
 
 def get_redis_client() -> Data:
@@ -64,30 +65,35 @@ def create_admin_user(data):
     print("Created user: {:s}".format(config['ADMIN_USER']))
 
 
-def refresh_metadata(data):
+def refresh_metadata(data, workers=1):
     """
     Cycle through all documents for all users and regenerate their cache and
-    metadata entries.
+    metadata entries. This renders in the calling process, as the web app
+    must; the console may use a pool of worker processes (0 = one per CPU).
     """
     config = load_env_config()
     host = config['WEB_HOST'] + ':' + config['WEB_HOST_PORT']
-    for user_slug in data.userSet_list():
-        for doc_slug in data.userDocumentSet_list(user_slug):
-            document = Document(data)
-            document.set_host(host)
-            document.load(user_slug, doc_slug)
-            document.save()
-            print(f'DATA: {user_slug}/{doc_slug}')
+    refresh_all(data, host, workers=workers)
 
 
-def initialize():
+def refresh_workers(workers=None):
+    """
+    Processes for a refresh run from the console: --workers, else
+    $REFRESH_WORKERS.
+    """
+    if workers is None:
+        workers = int(load_env_config()['REFRESH_WORKERS'])
+    return workers
+
+
+def initialize(workers=1):
     """
     Reset site to initial state.
     """
     data = get_redis_client()
     create_admin_user(data)
     load_fixtures(data)
-    refresh_metadata(data)
+    refresh_metadata(data, workers)
 
 
 # -------------------------------------------------------------------
@@ -97,25 +103,29 @@ def initialize():
 @click.command()
 @click.argument('command')
 @click.option('--title')
-def console(command, title):
+@click.option('--workers', type=int, help='Processes for refresh-metadata.')
+def console(command, title, workers):
     """Processes console commands."""
     if command == 'show-config':
         show_config()
     elif command == 'generate-epub':
         generate_epub()
+    elif command == 'epub-worker':
+        run_epub_worker(data)
     elif command == 'initialize':
-        initialize();
+        initialize(refresh_workers(workers));
     elif command == 'load-fixtures':
         load_fixtures(data)
-        refresh_metadata(data)
+        refresh_metadata(data, refresh_workers(workers))
     elif command == 'refresh-metadata':
-        refresh_metadata(data)
+        refresh_metadata(data, refresh_workers(workers))
     elif command == 'save-fixtures':
         save_fixtures(data)
     else:
         print("Commands:")
         print("  - show-config")
         print("  - generate-epub")
+        print("  - epub-worker")
         print("  - initialize")
         print("  - load-fixtures")
         print("  - refresh-metadata")
@@ -0,0 +1,90 @@
+"""
+Compression for cached values (rendered HTML, EPUBs).
+
+Encoded values start with a marker naming their codec, so entries stored
+before compression (or stored raw because compression didn't help) still
+read. Rendered HTML never starts with a NUL byte, and EPUBs start with "PK".
+
+> value = encode_value(get_codec("zlib"), html.encode("utf-8"))
+> html = decode_value(value).decode("utf-8")
+
+To add a codec, subclass Codec with a new marker and add it to CODECS.
+"""
+
+import zlib
+
+from typing import Dict, Optional
+
+MIN_SAVING = 0.1  # <-- Store raw unless compression saves 10%
+
+
+class Codec(object):
+    """
+    The null codec: values are stored as they are.
+    """
+
+    name = "none"
+    marker = b""
+
+    def compress(self, raw: bytes) -> bytes:
+        return raw
+
+    def decompress(self, payload: bytes) -> bytes:
+        return payload
+
+
+class ZlibCodec(Codec):
+    """
+    zlib (deflate); level 6 is zlib's default balance of size and speed.
+    """
+
+    name = "zlib"
+    marker = b"\x00z1:"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compress(self, raw: bytes) -> bytes:
+        return zlib.compress(raw, self.level)
+
+    def decompress(self, payload: bytes) -> bytes:
+        return zlib.decompress(payload)
+
+
+CODECS: Dict[str, Codec] = {
+    "none": Codec(),
+    "zlib": ZlibCodec(),
+}
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Look up a codec by name (e.g. from the CACHE_CODEC setting).
+    """
+    if name not in CODECS:
+        raise ValueError("Unknown cache codec: %s" % name)
+    return CODECS[name]
+
+
+def encode_value(codec: Codec, raw: bytes) -> bytes:
+    """
+    Compress a value and add its marker, or return it raw if that saves
+    less than MIN_SAVING.
+    """
+    if codec.marker:
+        payload = codec.marker + codec.compress(raw)
+        if len(payload) <= len(raw) * (1 - MIN_SAVING):
+            return payload
+    return raw
+
+
+def decode_value(value: Optional[bytes]) -> Optional[bytes]:
+    """
+    Decompress a value with the codec named by its marker; values without
+    a marker are returned as they are.
+    """
+    if value is not None and value[:1] == b"\x00":
+        for codec in CODECS.values():
+            if codec.marker and value.startswith(codec.marker):
+                return codec.decompress(value[len(codec.marker) :])
+    return value
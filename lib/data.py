@@ -17,7 +17,8 @@ Objects:
     - userDocumentSet: list of all document records (zset)
     - userDocumentMetadata: for homepage summary (hash)
     - userDocumentLastChanged: (list) trimmed to 10
-    - userDocumentCache: key
+    - userDocumentCache: key (compressed, see lib/compression.py)
+    - epubQueue: ebooks waiting to be built (list)
 
 Using this object as a context manager will execute all the operations in that
 group atomically:
@@ -27,18 +28,27 @@ with data as _:
     _.userDocumentSet_delete(user_slug, doc_slug)
     _.userDocumentMetadata_delete(user_slug, doc_slug)
     _.userDocumentCache_delete(user_slug, doc_slug)
+
+Connection pools are shared by every Data object in the process, and
+get_data() returns a shared Data object for a config:
+
+data = get_data()  # <-- load_env_config()
 """
 
 import os
+import threading
 import time
 import uuid
 
 import redis
 
-from datetime import datetime
-from typing import Dict, List, Union
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from lib.calendar import day_in_last_fortnight
+from lib.compression import decode_value, encode_value, get_codec
 from lib.slugs import slug
 from lib.wiki.utils import random_slug
 
@@ -49,6 +59,19 @@ RETENTION_DAYS = 14
 SECONDS_PER_DAY = 24 * 60 * 60
 MILLISECONDS_PER_DAY = SECONDS_PER_DAY * 1000
 
+PAGE_SIZE = 500  # <-- Records per round trip in the *_iter() readers
+
+SCAN_COUNT = 1000  # <-- Keys per SCAN step, and per UNLINK in delete_by_prefix()
+
+LOGIN_TTL = 30 * SECONDS_PER_DAY  # <-- Renewed whenever the login is used
+
+POOL_TIMEOUT = 20  # <-- Seconds to wait for a free connection
+
+POOLS = {}  # <-- {(host, port, ..., decode_responses): BlockingConnectionPool}
+DATA = {}  # <-- {(host, port, ..., strict): Data}, see get_data()
+TIME_SERIES = {}  # <-- {(host, port, ...): bool}, see Data.has_time_series()
+POOLS_LOCK = threading.Lock()
+
 
 def load_env_config() -> dict:
     """
@@ -62,17 +85,22 @@ def load_env_config() -> dict:
         "ADMIN_USER_PASSWORD": "password",
         "APP_HASH": "1111111111",
         "APP_NAME": "Article Wiki",
+        "CACHE_CODEC": "zlib",
         "ARTICLE_WIKI_CREDIT": "YES",
         "ARTICLE_WIKI_URL": "https://github.com/eukras/article-wiki",
+        "EPUB_WORKER": "YES",
         "GOOGLE_ANALYTICS_TRACKING_ID": "",
         "GOOGLE_TAG_MANAGER_ID": "",
         "PUBLIC_DIR": "/static",
         "REDIS_DATABASE": "0",
         "REDIS_HOST": "localhost",
+        "REDIS_MAX_CONNECTIONS": "64",
         "REDIS_PORT": "6379",
         "REDIS_USER": "default",
         "REDIS_PASSWORD": "password",
         "REDIS_TEST_DATABASE": "1",
+        "REFRESH_WORKERS": "0",
+        "RENDER_THREADS": "40",
         "SINGLE_USER": "YES",
         "TIME_ZONE": "Australia/Sydney",
         "UPLOAD_LIMIT_KB": "500",
@@ -91,6 +119,56 @@ def load_env_config() -> dict:
     return config
 
 
+def connection_key(config: dict) -> tuple:
+    """
+    The settings that identify a Redis database.
+    """
+    return (
+        config["REDIS_HOST"],
+        config["REDIS_PORT"],
+        config["REDIS_USER"],
+        config["REDIS_PASSWORD"],
+        config["REDIS_DATABASE"],
+    )
+
+
+def get_pool(config: dict, decode_responses: bool) -> redis.ConnectionPool:
+    """
+    Return the process-wide connection pool for a database. When all its
+    connections are in use, callers wait for one (up to POOL_TIMEOUT).
+    """
+    key = connection_key(config) + (decode_responses,)
+    with POOLS_LOCK:
+        if key not in POOLS:
+            host, port, username, password, db = connection_key(config)
+            POOLS[key] = redis.BlockingConnectionPool(
+                host=host,
+                port=int(port),
+                username=username,
+                password=password,
+                db=int(db),
+                decode_responses=decode_responses,
+                max_connections=int(config.get("REDIS_MAX_CONNECTIONS", 64)),
+                timeout=POOL_TIMEOUT,
+            )
+        return POOLS[key]
+
+
+def get_data(config: dict = None, strict: bool = False) -> "Data":
+    """
+    Return a Data object shared by the process; a new one per config is only
+    needed for different databases. Data is safe to share between threads.
+    """
+    if config is None:
+        config = load_env_config()
+    key = connection_key(config) + (config["ADMIN_USER"], config["TIME_ZONE"], strict)
+    if key not in DATA:
+        data = Data(config, strict=strict)
+        with POOLS_LOCK:
+            DATA.setdefault(key, data)
+    return DATA[key]
+
+
 class Data(object):
     """
     Provide a sensible and consistent interface to the underlying Redis
@@ -99,31 +177,41 @@ class Data(object):
 
     def __init__(self, config: dict, strict: bool = False):
         self.admin_user = config["ADMIN_USER"]
-        self.redis = redis.Redis(
-            config["REDIS_HOST"],
-            port=config["REDIS_PORT"],
-            username=config["REDIS_USER"],
-            password=config["REDIS_PASSWORD"],
-            db=config["REDIS_DATABASE"],
-            decode_responses=True,
-        )
-        self.redis_binary = redis.Redis(
-            config["REDIS_HOST"],
-            port=config["REDIS_PORT"],
-            username=config["REDIS_USER"],
-            password=config["REDIS_PASSWORD"],
-            db=config["REDIS_DATABASE"],
-        )
+        self.local = threading.local()  # <-- Pipelines are per thread
+        self.connection = redis.Redis(connection_pool=get_pool(config, True))
+        self.redis_binary = redis.Redis(connection_pool=get_pool(config, False))
+        self.connection_key = connection_key(config)
+        self.codec = get_codec(config.get("CACHE_CODEC", "zlib"))
         self.time_zone = config["TIME_ZONE"]
         self.strict = bool(strict)
-        self.redis_ts = self.redis.ts() if self.has_time_series() else None
+
+    @property
+    def redis_ts(self):
+        """
+        Time-series commands, or None if RedisDB doesn't have the feature;
+        probed on first use.
+        """
+        return self.connection.ts() if self.has_time_series() else None
+
+    @property
+    def redis(self):
+        """
+        The pipeline if this thread is inside a context manager, else the
+        connection.
+        """
+        pipelines = getattr(self.local, "pipelines", None)
+        return pipelines[-1] if pipelines else self.connection
 
     def has_time_series(self):
         """
-        Determine if RedisDB has time-series feature.
+        Determine if RedisDB has time-series feature; asked once per process.
         """
-        modules = self.redis.module_list()
-        return any(module.get("name") == "timeseries" for module in modules)
+        if self.connection_key not in TIME_SERIES:
+            modules = self.connection.module_list()
+            TIME_SERIES[self.connection_key] = any(
+                module.get("name") == "timeseries" for module in modules
+            )
+        return TIME_SERIES[self.connection_key]
 
     # ------------------
     # Pipeline Functions
@@ -132,18 +220,19 @@ class Data(object):
     def __enter__(self):
         """
         Replace self.redis with a pipeline; so all Data functions will now
-        accumulate and run atomically.
+        accumulate and run atomically. Other threads sharing this object keep
+        using the connection. Nested blocks each get their own pipeline.
         """
-        self.backup_redis_connection = self.redis
-        self.redis = self.redis.pipeline()
+        if not hasattr(self.local, "pipelines"):
+            self.local.pipelines = []
+        self.local.pipelines.append(self.connection.pipeline())
         return self
 
     def __exit__(self, *args):
         """
-        Execute the pipeline; restore normal self.redis.
+        Execute the pipeline; restore the enclosing pipeline, or the connection.
         """
-        self.redis.execute()
-        self.redis = self.backup_redis_connection
+        self.local.pipelines.pop().execute()
 
     def require_not_in_context_manager(self):
         """
@@ -177,11 +266,66 @@ class Data(object):
         return hashes
 
     def del_keys(self, keys: List[str]):
-        for key in keys:
-            self.redis.delete(key)
+        if keys:
+            self.redis.delete(*keys)
 
     def keys_by_prefix(self, prefix: str) -> List[str]:
-        return self.redis.keys(prefix + "*")
+        return list(self.scan_keys(prefix))
+
+    def scan_keys(self, prefix: str, count: int = SCAN_COUNT) -> Iterator[str]:
+        """
+        Yield the keys starting with prefix, using SCAN rather than KEYS so
+        that Redis can serve other clients between steps. A key may be
+        yielded twice if the keyspace is resized meanwhile.
+        """
+        return self.connection.scan_iter(match=prefix + "*", count=count)
+
+    def delete_by_prefix(self, prefix: str, count: int = SCAN_COUNT) -> int:
+        """
+        UNLINK the keys starting with prefix, count at a time (memory is
+        reclaimed in the background). Runs immediately, even inside a context
+        manager. Returns the number of keys removed.
+        """
+        keys = self.scan_keys(prefix, count)
+        removed = 0
+        while True:
+            batch = list(islice(keys, count))
+            if not batch:
+                return removed
+            removed += self.connection.unlink(*batch)
+
+    def zset_iter(self, key: str, page_size: int = PAGE_SIZE) -> Iterator[str]:
+        """
+        Yield the members of a sorted set in order, one ZRANGE per page.
+        Members added or removed meanwhile can shift the pages.
+        """
+        self.require_not_in_context_manager()
+        start = 0
+        while True:
+            page = self.redis.zrange(key, start, start + page_size - 1)
+            yield from page
+            if len(page) < page_size:
+                return
+            start += page_size
+
+    def hashes_iter(
+        self, pairs: Iterable[Tuple[str, str]], page_size: int = PAGE_SIZE
+    ) -> Iterator[Tuple[str, Optional[dict]]]:
+        """
+        Take (name, key) pairs; yield (name, record), with record None if the
+        key is missing, and one pipelined round trip per page.
+        """
+        self.require_not_in_context_manager()
+        pairs = iter(pairs)
+        while True:
+            page = list(islice(pairs, page_size))
+            if not page:
+                return
+            pipe = self.redis.pipeline(transaction=False)
+            for _, key in page:
+                pipe.hgetall(key)
+            for (name, _), record in zip(page, pipe.execute()):
+                yield name, (record if len(record) > 0 else None)
 
     # --------------
     # Authentication
@@ -201,12 +345,20 @@ class Data(object):
         token = uuid.uuid4().hex
         key = self.login_key(token)
         self.redis.hmset(key, user)
+        self.redis.expire(key, LOGIN_TTL)
         return token
 
     def login_get(self, token: str):
+        """
+        Return the login record, and renew its expiry, in one round trip.
+        """
         self.require_not_in_context_manager()
         if isinstance(token, str):
-            record = self.redis.hgetall(self.login_key(token))
+            key = self.login_key(token)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hgetall(key)
+            pipe.expire(key, LOGIN_TTL)  # <-- No-op if not found
+            record, _ = pipe.execute()
             if len(record) > 0:
                 return record
         return None
@@ -243,6 +395,9 @@ class Data(object):
         key = self.userSet_key()
         return self.redis.zrange(key, 0, -1)
 
+    def userSet_iter(self, page_size: int = PAGE_SIZE) -> Iterator[str]:
+        return self.zset_iter(self.userSet_key(), page_size)
+
     def userSet_count(self):
         self.require_not_in_context_manager()
         return self.redis.zcard(self.userSet_key())
@@ -276,12 +431,17 @@ class Data(object):
         self.redis.delete(self.user_key(user_slug))
 
     def user_hash(self) -> Dict[str, hash]:
+        return dict(self.user_iter())
+
+    def user_iter(self, page_size: int = PAGE_SIZE) -> Iterator[Tuple[str, dict]]:
         """
-        v.0.1.0: TODO: Upgrade to allow pagination.
+        Yield (user_slug, user) for all users, a page at a time.
         """
-        return {
-            user_slug: self.user_get(user_slug) for user_slug in self.userSet_list()
-        }
+        pairs = (
+            (user_slug, self.user_key(user_slug))
+            for user_slug in self.userSet_iter(page_size)
+        )
+        return self.hashes_iter(pairs, page_size)
 
     # ------------------
     # User Document Sets
@@ -307,6 +467,11 @@ class Data(object):
         key = self.userDocumentSet_key(user_slug)
         return self.redis.zrange(key, 0, -1)
 
+    def userDocumentSet_iter(
+        self, user_slug: str, page_size: int = PAGE_SIZE
+    ) -> Iterator[str]:
+        return self.zset_iter(self.userDocumentSet_key(user_slug), page_size)
+
     def userDocumentSet_delete(self, user_slug: str, doc_slug: str):
         key = self.userDocumentSet_key(user_slug)
         self.redis.zrem(key, doc_slug)
@@ -379,11 +544,7 @@ class Data(object):
         self.redis.delete(self.userDocument_key(user_slug, doc_slug))
 
     def userDocument_list(self, user_slug: str) -> List[hash]:
-        self.require_not_in_context_manager()
-        return [
-            self.userDocument_get(user_slug, doc_slug)
-            for doc_slug in self.userDocumentSet_list(user_slug)
-        ]
+        return [record for _, record in self.userDocument_iter(user_slug)]
 
     def userDocument_hash(self, user_slug: str) -> Dict[str, hash]:
         """
@@ -392,11 +553,20 @@ class Data(object):
 
         @todo: Restrict downloads to visible documents?
         """
-        self.require_not_in_context_manager()
-        return {
-            doc_slug: self.userDocument_get(user_slug, doc_slug)
-            for doc_slug in self.userDocumentSet_list(user_slug)
-        }
+        return dict(self.userDocument_iter(user_slug))
+
+    def userDocument_iter(
+        self, user_slug: str, page_size: int = PAGE_SIZE
+    ) -> Iterator[Tuple[str, dict]]:
+        """
+        Yield (doc_slug, userDocument) for a user's documents, a page at a
+        time.
+        """
+        pairs = (
+            (doc_slug, self.userDocument_key(user_slug, doc_slug))
+            for doc_slug in self.userDocumentSet_iter(user_slug, page_size)
+        )
+        return self.hashes_iter(pairs, page_size)
 
     # -----------------
     # DOCUMENT METADATA
@@ -416,6 +586,18 @@ class Data(object):
         record = self.redis.hgetall(self.userDocumentMetadata_key(user_slug, doc_slug))
         return record if len(record) > 0 else None
 
+    def userDocumentMetadata_iter(
+        self, user_slug: str, page_size: int = PAGE_SIZE
+    ) -> Iterator[Tuple[str, dict]]:
+        """
+        Yield (doc_slug, metadata) for a user's documents, a page at a time.
+        """
+        pairs = (
+            (doc_slug, self.userDocumentMetadata_key(user_slug, doc_slug))
+            for doc_slug in self.userDocumentSet_iter(user_slug, page_size)
+        )
+        return self.hashes_iter(pairs, page_size)
+
     def userDocumentMetadata_set(self, user_slug: str, doc_slug: str, metadata: dict):
         self.userDocumentSet_set(user_slug, doc_slug)
         udmk = self.userDocumentMetadata_key(user_slug, doc_slug)
@@ -476,17 +658,48 @@ class Data(object):
         self.require_not_in_context_manager()
         return self.redis.exists(self.userDocumentCache_key(user_slug, doc_slug))
 
-    def userDocumentCache_get(self, user_slug: str, doc_slug: str) -> Union[dict, None]:
+    def userDocumentCache_get(self, user_slug: str, doc_slug: str) -> Union[str, None]:
         self.require_not_in_context_manager()
-        return self.redis.get(self.userDocumentCache_key(user_slug, doc_slug))
+        key = self.userDocumentCache_key(user_slug, doc_slug)
+        value = decode_value(self.redis_binary.get(key))
+        return value.decode("utf-8") if value is not None else None
 
     def userDocumentCache_set(self, user_slug: str, doc_slug: str, text: str):
+        """
+        Writes go through self.redis, so they join any pipeline.
+        """
         key = self.userDocumentCache_key(user_slug, doc_slug)
-        self.redis.set(key, text)
+        self.redis.set(key, encode_value(self.codec, text.encode("utf-8")))
 
     def userDocumentCache_delete(self, user_slug: str, doc_slug: str):
         self.redis.delete(self.userDocumentCache_key(user_slug, doc_slug))
 
+    # ------------
+    # DEPENDENCIES
+    # ------------
+    # Fingerprints of each section from the last render, {part_slug: key},
+    # for working out which sections a save really changed.
+
+    def userDocumentDependencies_key(self, user_slug: str, doc_slug: str):
+        self.check_slugs(user_slug, doc_slug)
+        return "udd:{:s}:{:s}".format(user_slug, doc_slug)
+
+    def userDocumentDependencies_get(self, user_slug: str, doc_slug: str) -> dict:
+        self.require_not_in_context_manager()
+        key = self.userDocumentDependencies_key(user_slug, doc_slug)
+        return self.redis.hgetall(key)
+
+    def userDocumentDependencies_set(
+        self, user_slug: str, doc_slug: str, fingerprints: dict
+    ):
+        key = self.userDocumentDependencies_key(user_slug, doc_slug)
+        self.redis.delete(key)  # <-- Or else it merges
+        if len(fingerprints) > 0:
+            self.redis.hmset(key, fingerprints)
+
+    def userDocumentDependencies_delete(self, user_slug: str, doc_slug: str):
+        self.redis.delete(self.userDocumentDependencies_key(user_slug, doc_slug))
+
     # ----------
     # GENERATION
     # ----------
@@ -512,9 +725,53 @@ class Data(object):
         key = self.epubCachePlaceholder_key(user_slug, doc_slug)
         self.redis.set(key, "placeholder")
 
+    def epubCachePlaceholder_claim(
+        self, user_slug: str, doc_slug: str, expiry: int
+    ) -> bool:
+        key = self.epubCachePlaceholder_key(user_slug, doc_slug)
+        return bool(self.redis.set(key, "placeholder", nx=True, ex=expiry))
+
     def epubCachePlaceholder_delete(self, user_slug: str, doc_slug: str):
         self.redis.delete(self.epubCachePlaceholder_key(user_slug, doc_slug))
 
+    # Mark failed builds for a while, so they aren't retried on every reload...
+
+    def epubFailure_key(self, user_slug: str, doc_slug: str):
+        self.check_slugs(user_slug, doc_slug)
+        return "udef:{:s}:{:s}".format(user_slug, doc_slug)
+
+    def epubFailure_exists(self, user_slug: str, doc_slug: str) -> bool:
+        self.require_not_in_context_manager()
+        return self.redis.exists(self.epubFailure_key(user_slug, doc_slug))
+
+    def epubFailure_set(self, user_slug: str, doc_slug: str, expiry: int):
+        key = self.epubFailure_key(user_slug, doc_slug)
+        self.redis.set(key, "failed", ex=expiry)
+
+    def epubFailure_delete(self, user_slug: str, doc_slug: str):
+        self.redis.delete(self.epubFailure_key(user_slug, doc_slug))
+
+    # Queue epubs for a worker to build (see lib/jobs.py)...
+
+    def epubQueue_key(self) -> str:
+        return "udeq"
+
+    def epubQueue_push(self, user_slug: str, doc_slug: str):
+        self.check_slugs(user_slug, doc_slug)
+        self.redis.rpush(self.epubQueue_key(), f"{user_slug}/{doc_slug}")
+
+    def epubQueue_pop(self, timeout: int = 0) -> Union[Tuple[str, str], None]:
+        self.require_not_in_context_manager()
+        item = self.redis.blpop([self.epubQueue_key()], timeout=timeout)
+        if item is None:
+            return None
+        _, job = item
+        user_slug, doc_slug = job.split("/", 1)
+        return user_slug, doc_slug
+
+    def epubQueue_count(self) -> int:
+        return self.redis.llen(self.epubQueue_key())
+
     # Cache epubs...
 
     def epubCache_key(self, user_slug: str, doc_slug: str):
@@ -527,19 +784,22 @@ class Data(object):
 
     def epubCache_get(self, user_slug: str, doc_slug: str) -> Union[dict, None]:
         self.require_not_in_context_manager()
-        return self.redis_binary.get(self.epubCache_key(user_slug, doc_slug))
+        key = self.epubCache_key(user_slug, doc_slug)
+        return decode_value(self.redis_binary.get(key))
 
-    def epubCache_set(self, user_slug: str, doc_slug: str, text: str):
+    def epubCache_set(self, user_slug: str, doc_slug: str, text: bytes):
+        """
+        EPUBs are already zipped, so they are usually stored raw.
+        """
         key = self.epubCache_key(user_slug, doc_slug)
-        self.redis_binary.set(key, text, ex=3600)  # <-- keep for an hour
+        value = encode_value(self.codec, text)
+        self.redis_binary.set(key, value, ex=3600)  # <-- keep for an hour
 
     def epubCache_delete(self, user_slug: str, doc_slug: str):
         self.redis.delete(self.epubCache_key(user_slug, doc_slug))
 
-    def epubCache_deleteAll(self):
-        for user_slug in self.userSet_list():
-            for doc_slug in self.userDocumentSet_list(user_slug):
-                self.epubCache_delete(user_slug, doc_slug)
+    def epubCache_deleteAll(self) -> int:
+        return self.delete_by_prefix("udec:")
 
     # --------------------
     # TimeSeries functions
@@ -612,7 +872,22 @@ class RedisTimer(object):
 
     def __enter__(self):
         self.start = datetime.now()
+        self.paused = timedelta(0)
+        return self
 
     def __exit__(self, exc_type, exc_value, exc_trace):
-        elapsed_ms = (datetime.now() - self.start).total_seconds() * 1000
+        elapsed = datetime.now() - self.start - self.paused
+        elapsed_ms = elapsed.total_seconds() * 1000
         self.data.timeSeries_add(self.user_slug, self.doc_slug, self.label, elapsed_ms)
+
+    @contextmanager
+    def pause(self):
+        """
+        Leave the time spent in this block out, e.g. a streaming response
+        waiting for the client to take the next piece.
+        """
+        start = datetime.now()
+        try:
+            yield
+        finally:
+            self.paused += datetime.now() - start
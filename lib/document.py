@@ -5,6 +5,7 @@ from typing import Union, Tuple
 
 from lib.data import Data
 from lib.wiki.blocks import get_title_data
+from lib.wiki.dependencies import changed_fingerprints
 from lib.wiki.outline import iterate_parts
 from lib.wiki.settings import Settings
 from lib.wiki.wiki import Wiki
@@ -46,6 +47,7 @@ class Document(object):
         self.doc_slug = None
         self.parts = {}
         self.data = data
+        self.changed_parts = None  # <-- set of part slugs, after save()
 
     def __repr__(self):
         """
@@ -119,29 +121,26 @@ class Document(object):
         """
         Stores self.parts; compare with self.old to know how to update the
         metadata and cache.
+
+        When pregenerating, compare the new render's dependency graph with the
+        last one, and set self.changed_parts to the parts whose HTML really
+        changed (else None). If none did, the cached HTML and EPUB are kept;
+        otherwise they are replaced (HTML) or dropped (EPUB).
         """
         self.require_slugs()
         self.require_parts()
 
         # Old and new doc slugs may differ
         old_doc_slug = self.doc_slug
-        new_doc_slug = self.doc_slug
-
-        if update_doc_slug is None:
-            update_doc_slug = all(
-                [
-                    # fixtures, templates
-                    old_doc_slug
-                    not in PROTECTED_DOC_SLUGS
-                ]
-            )
-
-        if update_doc_slug:
-            if "index" in self.parts:
-                new_text = self.parts["index"]
-                _, _, title_slug, _ = get_title_data(new_text, "index")
-                if self.doc_slug != title_slug:
-                    new_doc_slug = title_slug
+        new_doc_slug = self.new_doc_slug(update_doc_slug)
+        renamed = old_doc_slug != new_doc_slug
+
+        previous = {}  # <-- Fingerprints of the cached HTML, if any
+        if pregenerate and not renamed:
+            if self.data.userDocumentCache_exists(self.user_slug, old_doc_slug):
+                previous = self.data.userDocumentDependencies_get(
+                    self.user_slug, old_doc_slug
+                )
 
         with self.data as _:
             _.userDocument_set(self.user_slug, new_doc_slug, self.parts)
@@ -149,39 +148,65 @@ class Document(object):
                 _.userDocumentLastChanged_set(
                     self.user_slug, old_doc_slug, new_doc_slug
                 )
-            _.userDocumentCache_delete(self.user_slug, old_doc_slug)
-            _.userDocumentMetadata_delete(self.user_slug, old_doc_slug)
+            if renamed or not pregenerate:  # <-- Else replaced below, if changed
+                _.userDocumentCache_delete(self.user_slug, old_doc_slug)
+                _.userDocumentDependencies_delete(self.user_slug, old_doc_slug)
+                _.userDocumentMetadata_delete(self.user_slug, old_doc_slug)
+                _.epubCache_delete(self.user_slug, old_doc_slug)
 
         self.doc_slug = new_doc_slug
+        self.changed_parts = None
 
         if pregenerate:
-
-            wiki = Wiki(
-                Settings(
-                    {
-                        "config:host": self.host,  # <-- ebooks req. FQDN
-                        "config:user": self.user_slug,
-                        "config:document": self.doc_slug,
-                        "ADMIN_USER": self.data.admin_user,
-                    }
-                )
+            html, fingerprints, metadata = render_document(
+                self.host,
+                self.data.admin_user,
+                self.data.time_zone,
+                self.user_slug,
+                self.doc_slug,
+                self.parts,
             )
-            html = wiki.process(self.user_slug, self.doc_slug, self.parts)
-            self.data.userDocumentCache_set(self.user_slug, self.doc_slug, html)
+            self.changed_parts = changed_fingerprints(fingerprints, previous)
+            if self.changed_parts:
+                with self.data as _:
+                    self.store_render(_, html, fingerprints, metadata)
+                    _.epubCache_delete(self.user_slug, self.doc_slug)
+            else:
+                self.data.userDocumentMetadata_set(  # <-- e.g. a default DATE
+                    self.user_slug, self.doc_slug, metadata
+                )
 
-            metadata = wiki.compile_metadata(
-                self.data.time_zone, self.user_slug, self.doc_slug
-            )
-            self.data.userDocumentMetadata_set(self.user_slug, self.doc_slug, metadata)
+        return self.doc_slug
 
+    def new_doc_slug(self, update_doc_slug=None) -> str:
+        """
+        The slug that save() will store the document under; this follows the
+        title in the index, except for protected documents (fixtures,
+        templates).
+        """
+        if update_doc_slug is None:
+            update_doc_slug = self.doc_slug not in PROTECTED_DOC_SLUGS
+        if update_doc_slug and "index" in self.parts:
+            _, _, title_slug, _ = get_title_data(self.parts["index"], "index")
+            return title_slug
         return self.doc_slug
 
+    def store_render(self, data: Data, html: str, fingerprints: dict, metadata: dict):
+        """
+        Write the results of render_document(); data may be in a pipeline (see
+        lib/refresh.py).
+        """
+        data.userDocumentCache_set(self.user_slug, self.doc_slug, html)
+        data.userDocumentDependencies_set(self.user_slug, self.doc_slug, fingerprints)
+        data.userDocumentMetadata_set(self.user_slug, self.doc_slug, metadata)
+
     def delete(self):
         """
         Drop whole document from database, including metadata, caching, etc.
         """
         with self.data as _:
             _.userDocumentCache_delete(self.user_slug, self.doc_slug)
+            _.userDocumentDependencies_delete(self.user_slug, self.doc_slug)
             _.userDocumentLastChanged_delete(self.user_slug, self.doc_slug)
             _.userDocumentMetadata_delete(self.user_slug, self.doc_slug)
             _.userDocumentSet_delete(self.user_slug, self.doc_slug)
@@ -375,3 +400,38 @@ class Document(object):
             pos += 3
         # If all OK...
         self.set_slugs(user_slug, doc_slug)
+
+
+# ----------------
+# Module functions
+# ----------------
+
+
+def render_document(
+    host: str,
+    admin_user: str,
+    time_zone: str,
+    user_slug: str,
+    doc_slug: str,
+    parts: dict,
+) -> Tuple[str, dict, dict]:
+    """
+    Render a document's HTML, section fingerprints and metadata.
+
+    This takes and returns only plain values, so that it can run in another
+    process (see lib/refresh.py).
+    """
+    wiki = Wiki(
+        Settings(
+            {
+                "config:host": host,  # <-- ebooks req. FQDN
+                "config:user": user_slug,
+                "config:document": doc_slug,
+                "ADMIN_USER": admin_user,
+            }
+        )
+    )
+    html = wiki.process(user_slug, doc_slug, parts)
+    fingerprints = wiki.dependencies.fingerprints()
+    metadata = wiki.compile_metadata(time_zone, user_slug, doc_slug)
+    return html, fingerprints, metadata
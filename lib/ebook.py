@@ -3,15 +3,21 @@
 
 """
 Library for turning Artikle Wiki docs into ebooks.
+
+Ebooks are built in memory (cover, CSS, chapters and zip), so concurrent
+builds share no files:
+
+> content = make_epub(data, user_slug, doc_slug)  # <-- bytes
 """
 
-import os
+import io
 from datetime import datetime
+from functools import lru_cache
 
 from ebooklib import epub
 
 from lib.bokeh import make_background
-from lib.data import Data, load_env_config
+from lib.data import Data, get_data
 from lib.overlay import make_cover
 from lib.wiki.settings import Settings
 from lib.wiki.wiki import Wiki
@@ -21,11 +27,29 @@ COLOR_SHADOW = (154, 174, 154)  # <-- Some greeny gray thing
 COLOR_BACKGROUND = (160, 184, 160)  # <-- Norway, Summer Green, Pewter
 
 
-def write_epub(user_slug, doc_slug, file_path):
-    # Get all the data
-    config = load_env_config()
-    data = Data(config)
+@lru_cache(maxsize=1)
+def epub_css() -> str:
+    """
+    The ebook stylesheet, read once.
+    """
+    with open("static/epub.css") as f:
+        return f.read()
 
+
+def write_epub(user_slug, doc_slug, file_path):
+    """
+    Write an ebook to a file.
+    """
+    data = get_data()
+    content = make_epub(data, user_slug, doc_slug)
+    with open(file_path, "wb") as f:
+        f.write(content)
+
+
+def make_epub(data: Data, user_slug: str, doc_slug: str) -> bytes:
+    """
+    Build an ebook and return the .epub file contents.
+    """
     user = data.user_get(user_slug)  # or None
     if not user:
         raise RuntimeError("User not found: %s", user_slug)
@@ -51,7 +75,7 @@ def write_epub(user_slug, doc_slug, file_path):
     )
     wiki = Wiki(settings)
     xhtml = wiki.process(user_slug, doc_slug, document)
-    metadata = wiki.compile_metadata(config["TIME_ZONE"], user_slug, doc_slug)
+    metadata = wiki.compile_metadata(data.time_zone, user_slug, doc_slug)
     metadata["url"] = ("/read/{:s}/{:s}".format(user_slug, doc_slug),)
 
     title = metadata.get("title", "Untitled")
@@ -71,29 +95,26 @@ def write_epub(user_slug, doc_slug, file_path):
     book.add_author(author)
 
     # define CSS style
-    with open("static/epub.css") as f:
-        style = f.read()
     global_css = epub.EpubItem(
-        uid="style_nav", file_name="style/nav.css", media_type="text/css", content=style
+        uid="style_nav",
+        file_name="style/nav.css",
+        media_type="text/css",
+        content=epub_css(),
     )
     book.add_item(global_css)
 
     # -------------------------
     # 1. Create Cover
 
-    tmp_cover_file = "/tmp/%s-%s-cover.png" % (user_slug, doc_slug)
     image = make_background((1600, 2200), (160, 184, 160))
     cover = make_cover(
         image, [title, summary, author, date], [COLOR_TEXT, COLOR_SHADOW]
     )
-    cover.save(tmp_cover_file, "JPEG")
+    cover_buffer = io.BytesIO()
+    cover.save(cover_buffer, "JPEG")
+    book.set_cover("image.jpg", cover_buffer.getvalue())
     chapter_file_name = doc_slug + ".xhtml"
 
-    assert os.path.exists(tmp_cover_file)
-    with open(tmp_cover_file, "rb") as file:
-        cover_image = file.read()
-        book.set_cover("image.jpg", cover_image)
-
     # -------------------------
     # 2. Create Title Page
 
@@ -140,5 +161,7 @@ def write_epub(user_slug, doc_slug, file_path):
     # basic spine
     book.spine = ["nav", c1, c2]
 
-    # write to the file
-    epub.write_epub(file_path, book, {})
+    # write to memory
+    buffer = io.BytesIO()
+    epub.write_epub(buffer, book, {"raise_exceptions": True})
+    return buffer.getvalue()
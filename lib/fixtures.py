@@ -36,6 +36,7 @@ def load_user_document(data: Data, user_slug: str, doc_slug: str):
     src_dict = load_dir(src_dir)
     data.userDocument_set(user_slug, doc_slug, src_dict, {})
     data.userDocumentCache_delete(user_slug, doc_slug)
+    data.userDocumentDependencies_delete(user_slug, doc_slug)
 
 
 def save_user_document(data: Data, user_slug: str, doc_slug: str):
@@ -0,0 +1,87 @@
+"""
+Background jobs: building ebooks outside of request handlers.
+
+Building an EPUB renders the whole document, draws a cover and zips the
+result, which is too slow to do while a request waits. Instead:
+
+- A request for an ebook that isn't cached claims the document's EPUB
+  placeholder (SET NX, with an expiry in case a build dies), and only if it
+  was the first to do so pushes a job onto a Redis list. Later requests see
+  the placeholder, so duplicate requests collapse into one build.
+- A worker pops jobs, builds and caches the ebook, and clears the placeholder.
+  If a build fails it marks the document for a while, so that requests show
+  an error instead of queueing it again. It runs as a thread in the web app
+  (EPUB_WORKER=YES) or on its own:
+
+> python command.py epub-worker
+"""
+
+import logging
+import threading
+
+from typing import Optional, Tuple
+
+from lib.data import Data
+from lib.ebook import make_epub
+
+EPUB_BUILD_SECONDS = 300  # <-- After which an unfinished build may be retried
+EPUB_POLL_SECONDS = 5  # <-- How often an idle worker checks for shutdown
+EPUB_FAILURE_SECONDS = 60  # <-- How long a failed build is reported, not retried
+
+
+def request_epub(data: Data, user_slug: str, doc_slug: str) -> bool:
+    """
+    Queue an ebook build unless one is already pending; returns whether a
+    new job was queued.
+    """
+    if not data.epubCachePlaceholder_claim(user_slug, doc_slug, EPUB_BUILD_SECONDS):
+        return False
+    data.epubQueue_push(user_slug, doc_slug)
+    return True
+
+
+def build_epub(data: Data, user_slug: str, doc_slug: str) -> bool:
+    """
+    Build and cache one ebook, then clear its placeholder. On failure, mark
+    it as failed for EPUB_FAILURE_SECONDS, after which it can be requested
+    again. Returns whether it succeeded.
+    """
+    try:
+        if data.epubCache_exists(user_slug, doc_slug):
+            return True  # <-- Queued twice, e.g. after the placeholder expired
+        content = make_epub(data, user_slug, doc_slug)
+        data.epubCache_set(user_slug, doc_slug, content)
+        return True
+    except Exception:
+        logging.exception(f"EPUB build failed: {user_slug}/{doc_slug}")
+        data.epubFailure_set(user_slug, doc_slug, EPUB_FAILURE_SECONDS)
+        return False
+    finally:
+        data.epubCachePlaceholder_delete(user_slug, doc_slug)
+
+
+def run_epub_worker(data: Data, stop: Optional[threading.Event] = None):
+    """
+    Build queued ebooks until stopped.
+    """
+    while stop is None or not stop.is_set():
+        job = data.epubQueue_pop(timeout=EPUB_POLL_SECONDS)
+        if job is not None:
+            user_slug, doc_slug = job
+            build_epub(data, user_slug, doc_slug)
+
+
+def start_epub_worker(config: dict) -> Tuple[threading.Thread, threading.Event]:
+    """
+    Run a worker in a daemon thread, with its own connection for blocking
+    pops. Set the returned event to stop it.
+    """
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=run_epub_worker,
+        args=(Data(config), stop),
+        name="epub-worker",
+        daemon=True,
+    )
+    thread.start()
+    return thread, stop
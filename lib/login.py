@@ -1,6 +1,40 @@
-from lib.data import Data, load_env_config
+import threading
+
+from typing import Optional
+
+from cachetools import TTLCache
 from fastapi import HTTPException, Request, status
 
+from lib.data import Data, get_data
+
+# Validated logins, so that repeated requests (e.g. editor previews) skip
+# Redis; a logout in another process is seen within SESSION_TTL seconds.
+SESSION_TTL = 5
+SESSIONS = TTLCache(maxsize=1024, ttl=SESSION_TTL)  # <-- {token: record}
+SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(data: Data, token: str) -> Optional[dict]:
+    """
+    Return the login record for a token, from SESSIONS or Redis.
+    """
+    with SESSIONS_LOCK:
+        record = SESSIONS.get(token)
+    if record is None:
+        record = data.login_get(token)
+        if record:
+            with SESSIONS_LOCK:
+                SESSIONS[token] = record
+    return record
+
+
+def forget_session(token: str):
+    """
+    Drop a token from SESSIONS, e.g. on logout.
+    """
+    with SESSIONS_LOCK:
+        SESSIONS.pop(token, None)
+
 
 class Login:
     """
@@ -11,10 +45,10 @@ class Login:
         """
         Return a logged-in user account, or trigger a 401.
         """
-        data = Data(load_env_config())
+        data = get_data()
         token = request.cookies.get("token", "")
         if token:
-            user = data.login_get(token)
+            user = get_session(data, token)
             self.username = user["username"] if user else None
             self.is_admin = user["is_admin"] if user else None
         else:
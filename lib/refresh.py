@@ -0,0 +1,143 @@
+"""
+Regenerate the cache and metadata for every document.
+
+Wiki.process() is CPU-bound pure Python, so the console can render documents
+in a pool of worker processes; results are written back to Redis in
+pipelined batches, and documents are read a batch at a time:
+
+> count = refresh_all(data, host, workers=4)
+
+The pool starts its workers with "spawn", so that they don't inherit locks
+held by other threads (e.g. in the web app). Requests should still refresh
+with workers=1, which renders in the calling process.
+
+Documents whose slug would change (because the title in their index has
+changed since they were saved) are saved normally afterwards, since renaming
+moves several keys, and then deleted under their old slugs.
+"""
+
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Iterator, List
+
+from lib.data import Data
+from lib.document import PROTECTED_DOC_SLUGS, Document, render_document
+
+REFRESH_BATCH_SIZE = 20  # <-- Documents per pipeline
+
+
+def refresh_all(
+    data: Data,
+    host: str,
+    workers: int = 1,
+    progress: Callable = print,
+) -> int:
+    """
+    Re-render all documents for all users; workers > 1 uses a pool of worker
+    processes (0 = one per CPU). Returns the number of documents refreshed.
+    """
+    if not workers:
+        workers = os.cpu_count() or 1
+
+    count = 0
+
+    def report(document):
+        nonlocal count
+        count += 1
+        progress(f"DATA: {document.user_slug}/{document.doc_slug} ({count})")
+
+    renamed = []
+    documents = iter_documents(data, host, renamed)
+    for batch in render_all(documents, data, host, workers):
+        store_batch(data, batch)
+        for document, _ in batch:
+            report(document)
+
+    for document in renamed:  # <-- Once the sets are no longer being read
+        old_doc_slug = document.doc_slug
+        document.save()
+        old_doc = Document(data)  # <-- As in post_edit_part()
+        if old_doc.load(document.user_slug, old_doc_slug):
+            if old_doc.doc_slug != document.doc_slug:
+                old_doc.delete()
+        report(document)
+
+    return count
+
+
+def iter_documents(data: Data, host: str, renamed: list) -> Iterator[Document]:
+    """
+    Yield the documents to re-render in place; those whose slug would change
+    are added to renamed instead.
+
+    Storing a render moves the document to the end of its user's set, so the
+    slugs are listed before any are stored, rather than paged by offset.
+    """
+    for user_slug in list(data.userSet_iter()):
+        doc_slugs = list(data.userDocumentSet_iter(user_slug))
+        pairs = ((_, data.userDocument_key(user_slug, _)) for _ in doc_slugs)
+        for doc_slug, parts in data.hashes_iter(pairs):
+            if not parts:
+                continue
+            document = Document(data)
+            document.set_host(host)
+            document.set_parts(user_slug, doc_slug, parts)
+            if document.new_doc_slug() != doc_slug:
+                renamed.append(document)
+            else:
+                yield document
+
+
+def render_all(
+    documents: Iterator[Document], data: Data, host: str, workers: int
+) -> Iterator[List[tuple]]:
+    """
+    Yield batches of (document, render_document() result) pairs, in the order
+    given (which keeps the last-changed lists in the same order as a serial
+    refresh). Only one batch of documents is held at a time.
+    """
+
+    def arguments(document):
+        return (
+            host,
+            data.admin_user,
+            data.time_zone,
+            document.user_slug,
+            document.doc_slug,
+            document.parts,
+        )
+
+    def batches():
+        while True:
+            batch = list(islice(documents, REFRESH_BATCH_SIZE))
+            if not batch:
+                return
+            yield batch
+
+    if workers <= 1:
+        for batch in batches():
+            yield [(_, render_document(*arguments(_))) for _ in batch]
+        return
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        for batch in batches():
+            futures = [executor.submit(render_document, *arguments(_)) for _ in batch]
+            yield [(_, future.result()) for _, future in zip(batch, futures)]
+
+
+def store_batch(data: Data, batch: list):
+    """
+    Write a batch of renders in one pipeline, and drop their ebooks; this
+    matches Document.save() for documents that keep their slug.
+    """
+    with data as _:
+        for document, (html, fingerprints, metadata) in batch:
+            user_slug, doc_slug = document.user_slug, document.doc_slug
+            if doc_slug not in PROTECTED_DOC_SLUGS:
+                _.userDocumentLastChanged_set(user_slug, doc_slug, doc_slug)
+            document.store_render(_, html, fingerprints, metadata)
+            _.epubCache_delete(user_slug, doc_slug)
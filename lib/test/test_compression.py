@@ -0,0 +1,33 @@
+"""
+Test the cache compression codecs.
+"""
+
+import pytest
+
+from .context import lib  # noqa: F401
+
+from lib.compression import ZlibCodec, decode_value, encode_value, get_codec
+
+
+def test_encode_value():
+    html = ("<p>Repetitive markup.</p>" * 100).encode("utf-8")
+    value = encode_value(get_codec("zlib"), html)
+    assert value.startswith(ZlibCodec.marker)
+    assert len(value) < len(html) / 10
+    assert decode_value(value) == html
+
+
+def test_encode_value_raw():
+    assert encode_value(get_codec("none"), b"<p>Raw</p>" * 100) == b"<p>Raw</p>" * 100
+    assert encode_value(get_codec("zlib"), b"PK\x03\x04") == b"PK\x03\x04"  # <-- Small
+
+
+def test_decode_value():
+    assert decode_value(None) is None
+    assert decode_value(b"<article>...</article>") == b"<article>...</article>"
+    assert decode_value(ZlibCodec(level=9).marker + ZlibCodec().compress(b"x")) == b"x"
+
+
+def test_get_codec():
+    with pytest.raises(ValueError):
+        get_codec("nonexistent")
@@ -2,10 +2,14 @@
 Test the redis interface for user and docs handling.
 """
 
+import threading
+import time
+
 import pytest
 from .context import lib  # noqa: F401
 
-from lib.data import Data, load_env_config
+from lib.compression import ZlibCodec
+from lib.data import LOGIN_TTL, Data, RedisTimer, get_data, get_pool, load_env_config
 from lib.wiki.sample_data import minimal_document
 from lib.wiki.utils import random_slug
 
@@ -34,6 +38,27 @@ def test_utility_functions():
     assert not data.redis.exists(test_slug)
 
 
+@pytest.mark.integration
+def test_delete_by_prefix():
+    """
+    Sweep keys by prefix with SCAN and UNLINK, in small batches.
+    """
+    data = setup()
+    prefix = random_slug("test-sweep-") + ":"
+    keys = [prefix + str(_) for _ in range(25)]
+    for key in keys:
+        data.redis.set(key, "value")
+    data.redis.set("other-key", "value")
+    assert sorted(data.scan_keys(prefix, count=10)) == sorted(keys)
+    assert data.delete_by_prefix(prefix, count=10) == 25
+    assert data.keys_by_prefix(prefix) == []
+    assert data.redis.exists("other-key")
+
+    data.epubCache_set("user", "doc", b"epub")
+    assert data.epubCache_deleteAll() == 1
+    assert not data.epubCache_exists("user", "doc")
+
+
 @pytest.mark.integration
 def test_auth_functions():
     """
@@ -42,8 +67,11 @@ def test_auth_functions():
     data = setup()
     test_user = {"slug": "test"}
     token = data.login_set(test_user)
+    assert 0 < data.redis.ttl(data.login_key(token)) <= LOGIN_TTL
+    data.redis.expire(data.login_key(token), 60)
     assert data.login_get("wrong-token") is None
     assert data.login_get(token) == test_user
+    assert data.redis.ttl(data.login_key(token)) > 60  # <-- Renewed
     data.login_delete(token)
     assert data.login_get(token) is None
 
@@ -177,6 +205,32 @@ def test_userDocuments():
     # get_dict / archive ?
 
 
+@pytest.mark.integration
+def test_paged_readers():
+    """
+    The *_iter() readers return everything, in order, whatever the page size.
+    """
+    data = setup()
+    user_slug = random_slug("test-user-")
+    doc_slugs = [random_slug("test-document-") for _ in range(7)]
+    for doc_slug in doc_slugs:
+        data.userDocument_set(user_slug, doc_slug, minimal_document)
+        data.userDocumentMetadata_set(user_slug, doc_slug, {"slug": doc_slug})
+
+    expected = data.userDocumentSet_list(user_slug)
+    assert sorted(expected) == sorted(doc_slugs)
+    for page_size in [1, 3, 7, 100]:
+        assert list(data.userDocumentSet_iter(user_slug, page_size)) == expected
+        documents = list(data.userDocument_iter(user_slug, page_size))
+        assert documents == [(_, minimal_document) for _ in expected]
+        metadata = list(data.userDocumentMetadata_iter(user_slug, page_size))
+        assert metadata == [(_, {"slug": _}) for _ in expected]
+
+    data.userDocument_delete(user_slug, doc_slugs[0])
+    assert (doc_slugs[0], None) in list(data.userDocument_iter(user_slug, 2))
+    assert user_slug in [_ for _, __ in data.user_iter(page_size=2)]
+
+
 @pytest.mark.integration
 def test_userDocumentMetadata():
     """
@@ -250,6 +304,120 @@ def test_userDocumentCache():
     assert data.userDocumentCache_exists(user_slug, doc_slug)
     assert data.userDocumentCache_get(user_slug, doc_slug) == html
 
+    long_html = "<article>" + "<p>Paragraph.</p>" * 100 + "</article>"
+    data.userDocumentCache_set(user_slug, doc_slug, long_html)
+    assert data.redis_binary.get(key).startswith(ZlibCodec.marker)
+    assert data.userDocumentCache_get(user_slug, doc_slug) == long_html
+    data.redis.set(key, long_html)  # <-- As stored before compression
+    assert data.userDocumentCache_get(user_slug, doc_slug) == long_html
+
     data.userDocumentCache_delete(user_slug, doc_slug)
     assert not data.userDocumentCache_exists(user_slug, doc_slug)
     assert data.userDocumentCache_get(user_slug, doc_slug) is None
+
+
+@pytest.mark.integration
+def test_userDocumentDependencies():
+    data = setup()
+    user_slug = random_slug("test-user-")
+    doc_slug = random_slug("test-document-")
+    assert data.userDocumentDependencies_get(user_slug, doc_slug) == {}
+
+    fingerprints = {"index": "abc", "part-one": "def"}
+    data.userDocumentDependencies_set(user_slug, doc_slug, fingerprints)
+    assert data.userDocumentDependencies_get(user_slug, doc_slug) == fingerprints
+
+    data.userDocumentDependencies_delete(user_slug, doc_slug)
+    assert data.userDocumentDependencies_get(user_slug, doc_slug) == {}
+
+
+@pytest.mark.integration
+def test_epubQueue():
+    data = setup()
+    user_slug = random_slug("test-user-")
+    doc_slug = random_slug("test-document-")
+
+    assert data.epubCachePlaceholder_claim(user_slug, doc_slug, 60)
+    assert not data.epubCachePlaceholder_claim(user_slug, doc_slug, 60)
+    assert data.epubCachePlaceholder_exists(user_slug, doc_slug)
+
+    assert data.epubQueue_count() == 0
+    assert data.epubQueue_pop(timeout=1) is None
+    data.epubQueue_push(user_slug, doc_slug)
+    assert data.epubQueue_count() == 1
+    assert data.epubQueue_pop(timeout=1) == (user_slug, doc_slug)
+    assert data.epubQueue_count() == 0
+
+    data.epubCachePlaceholder_delete(user_slug, doc_slug)
+    assert data.epubCachePlaceholder_claim(user_slug, doc_slug, 60)
+
+
+@pytest.mark.integration
+def test_pipeline_per_thread():
+    """
+    A pipeline in one thread doesn't capture another thread's commands.
+    """
+    data = setup()
+    user_slug = random_slug("test-user-")
+    doc_slug = random_slug("test-document-")
+    results = []
+
+    def other_thread():
+        data.userDocumentCache_set(user_slug, doc_slug, "<p>Other</p>")
+        results.append(data.userDocumentCache_get(user_slug, doc_slug))
+
+    with data as _:
+        _.userDocumentCache_set(user_slug, "pipelined", "<p>Pipelined</p>")
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+
+    assert results == ["<p>Other</p>"]
+    assert data.userDocumentCache_get(user_slug, "pipelined") == "<p>Pipelined</p>"
+
+
+def test_shared_pools():
+    """
+    Data objects share connection pools; creating them doesn't connect.
+    """
+    config = load_env_config()
+    config["REDIS_DATABASE"] = "1"
+    first, second = Data(config), Data(config)
+    assert first.connection.connection_pool is get_pool(config, True)
+    assert second.connection.connection_pool is get_pool(config, True)
+    assert first.redis_binary.connection_pool is get_pool(config, False)
+    assert get_pool(config, True) is not get_pool(config, False)
+    assert get_data(config) is get_data(config)
+    assert get_data(config) is not get_data(config, strict=True)
+
+
+def test_redis_timer_pause(monkeypatch):
+    """
+    Time spent paused (e.g. waiting for a streaming client) isn't recorded.
+    """
+    config = load_env_config()
+    config["REDIS_DATABASE"] = "1"
+    data = Data(config)
+    recorded = []
+    monkeypatch.setattr(data, "timeSeries_add", lambda *_: recorded.append(_))
+    with RedisTimer(data, "user", "doc", "read") as timer:
+        with timer.pause():
+            time.sleep(0.2)
+    assert len(recorded) == 1
+    assert recorded[0][:3] == ("user", "doc", "read")
+    assert recorded[0][3] < 100  # <-- ms
+
+
+def test_nested_pipelines():
+    """
+    Each nested `with data` block has its own pipeline.
+    """
+    config = load_env_config()
+    config["REDIS_DATABASE"] = "1"
+    data = Data(config)
+    with data as outer:
+        outer_pipeline = outer.redis
+        with data as inner:
+            assert inner.redis is not outer_pipeline
+        assert data.redis is outer_pipeline
+    assert data.redis is data.connection
@@ -7,10 +7,12 @@ Tests:
 
 import pytest
 
+from copy import deepcopy
+
 from .context import lib  # noqa: F401
 
 from lib.data import Data
-from lib.document import Document
+from lib.document import Document, render_document
 from lib.wiki.sample_data import minimal_document
 from lib.wiki.utils import random_slug, trim
 
@@ -41,7 +43,7 @@ def test_repr_save_load_delete():
     doc_slug = random_slug("test-doc-")
     doc = Document(data)
     doc.set_host("http://example.org")
-    doc.set_parts(user_slug, doc_slug, minimal_document)
+    doc.set_parts(user_slug, doc_slug, deepcopy(minimal_document))
 
     # Create
     new_doc_slug = doc.save(pregenerate=True, update_doc_slug=True)
@@ -60,6 +62,20 @@ def test_repr_save_load_delete():
     assert data.userDocumentCache_exists(user_slug, new_doc_slug)
     assert data.userDocumentSet_exists(user_slug, new_doc_slug)
 
+    # Unchanged: the cached HTML and EPUB are kept
+    data.epubCache_set(user_slug, new_doc_slug, b"epub")
+    doc.save(pregenerate=True, update_doc_slug=True)
+    assert doc.changed_parts == set()
+    assert data.userDocumentCache_exists(user_slug, new_doc_slug)
+    assert data.epubCache_exists(user_slug, new_doc_slug)
+
+    # Changed: the EPUB is dropped
+    doc.parts["index"] += "\n\nMore text."
+    doc.save(pregenerate=True, update_doc_slug=True)
+    assert doc.changed_parts == {"index"}
+    assert "More text." in data.userDocumentCache_get(user_slug, new_doc_slug)
+    assert not data.epubCache_exists(user_slug, new_doc_slug)
+
     # Rename
     doc.set_index(
         trim(
@@ -230,10 +246,26 @@ def test_import_and_export_document():
     doc1 = Document(data)
     user_slug = random_slug("test-user-")
     doc_slug = random_slug("test-doc-")
-    doc1.set_parts(user_slug, doc_slug, minimal_document)
+    doc1.set_parts(user_slug, doc_slug, deepcopy(minimal_document))
     file_name, file_text = doc1.export_txt_file()
     assert user_slug in file_name
     assert doc_slug in file_name
     doc2 = Document(data)
     doc2.import_txt_file(user_slug, doc_slug, file_text)
     assert doc1 == doc2
+
+
+def test_render_document():
+    """Confirms that a render needs only plain values (for worker processes)."""
+    html, fingerprints, metadata = render_document(
+        "http://example.org",
+        "admin",
+        "Australia/Sydney",
+        "user-slug",
+        "example-document",
+        minimal_document,
+    )
+    assert "Example document!" in html
+    assert "index" in fingerprints
+    assert metadata["slug"] == "example-document"
+    assert metadata["user"] == "user-slug"
@@ -2,11 +2,25 @@
 Test writing epubs
 """
 
+import io
 import os
+import zipfile
 
 import pytest
 
-from lib.ebook import write_epub
+from lib.data import Data, load_env_config
+from lib.ebook import make_epub, write_epub
+from lib.fixtures import load_fixtures
+
+
+def setup():
+    config = load_env_config()
+    config["REDIS_DATABASE"] = 1
+    data = Data(config)
+    data.redis.flushdb()
+    data.user_set("admin", {"slug": "admin", "password": "password"})
+    load_fixtures(data)
+    return data
 
 
 @pytest.mark.integration
@@ -20,3 +34,16 @@ def test_write_epub():
 
     write_epub("admin", "help", file_path)
     assert os.path.exists(file_path)
+
+
+@pytest.mark.integration
+def test_make_epub():
+    """
+    Test building an epub in memory
+    """
+    data = setup()
+    content = make_epub(data, "admin", "help")
+    names = zipfile.ZipFile(io.BytesIO(content)).namelist()
+    assert names[0] == "mimetype"
+    assert "EPUB/image.jpg" in names
+    assert "EPUB/help.xhtml" in names
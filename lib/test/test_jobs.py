@@ -0,0 +1,56 @@
+"""
+Background jobs.
+
+Tests:
+    lib/jobs.py
+"""
+
+import pytest
+
+from .context import lib  # noqa: F401
+
+from lib.data import Data, load_env_config
+from lib.fixtures import load_fixtures
+from lib.jobs import build_epub, request_epub
+
+
+def setup():
+    config = load_env_config()
+    config["REDIS_DATABASE"] = 1
+    data = Data(config)
+    data.redis.flushdb()
+    return data
+
+
+@pytest.mark.integration
+def test_request_epub():
+    """
+    Confirms that repeated requests queue only one build.
+    """
+    data = setup()
+    assert request_epub(data, "admin", "help")
+    assert not request_epub(data, "admin", "help")
+    assert data.epubQueue_count() == 1
+
+
+@pytest.mark.integration
+def test_build_epub():
+    """
+    Confirms that a build caches the ebook and clears the placeholder, even
+    when it fails.
+    """
+    data = setup()
+    data.user_set("admin", {"slug": "admin", "password": "password"})
+    load_fixtures(data)
+
+    assert request_epub(data, "admin", "help")
+    assert data.epubQueue_pop(timeout=1) == ("admin", "help")
+    assert build_epub(data, "admin", "help")
+    assert data.epubCache_exists("admin", "help")
+    assert not data.epubCachePlaceholder_exists("admin", "help")
+
+    assert request_epub(data, "admin", "no-such-document")
+    assert not build_epub(data, "admin", "no-such-document")
+    assert not data.epubCachePlaceholder_exists("admin", "no-such-document")
+    assert data.epubFailure_exists("admin", "no-such-document")
+    assert not data.epubFailure_exists("admin", "help")
@@ -0,0 +1,35 @@
+"""
+Test the session cache in front of Data.login_get().
+"""
+
+from .context import lib  # noqa: F401
+
+from lib.login import SESSIONS, forget_session, get_session
+
+
+class Logins(object):
+    """
+    Just the login_get() of Data, counting lookups.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.lookups = 0
+
+    def login_get(self, token):
+        self.lookups += 1
+        return self.records.get(token)
+
+
+def test_get_session():
+    SESSIONS.clear()
+    data = Logins({"token": {"username": "admin", "is_admin": "1"}})
+    assert get_session(data, "token") == {"username": "admin", "is_admin": "1"}
+    assert get_session(data, "token") == {"username": "admin", "is_admin": "1"}
+    assert data.lookups == 1
+    assert get_session(data, "wrong-token") is None
+    assert get_session(data, "wrong-token") is None
+    assert data.lookups == 3  # <-- Misses aren't cached
+    forget_session("token")
+    del data.records["token"]
+    assert get_session(data, "token") is None
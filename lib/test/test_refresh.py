@@ -0,0 +1,71 @@
+"""
+Regenerating all documents.
+
+Tests:
+    lib/refresh.py
+"""
+
+import pytest
+
+from copy import deepcopy
+
+from .context import lib  # noqa: F401
+
+from lib.data import Data
+from lib.document import Document
+from lib.refresh import refresh_all
+from lib.wiki.sample_data import minimal_document
+from lib.wiki.utils import random_slug
+
+
+def setup():
+    config = {
+        "REDIS_HOST": "localhost",
+        "REDIS_PORT": 6379,
+        "REDIS_USER": "default",
+        "REDIS_PASSWORD": "password",
+        "REDIS_DATABASE": 1,  # <-- TESTING
+        "ADMIN_USER": "admin",
+        "TIME_ZONE": "Australia/Sydney",
+    }
+    data = Data(config, strict=True)
+    return data
+
+
+@pytest.mark.integration
+def test_refresh_all():
+    """
+    Confirms that a parallel refresh regenerates caches and metadata, and
+    saves renamed documents under their new slugs.
+    """
+    data = setup()
+    data.redis.flushdb()
+
+    user_slug = random_slug("test-user-")
+    doc_slugs = []
+    for title in ["First", "Second", "Third"]:
+        doc = Document(data)
+        doc.set_host("http://example.org")
+        parts = dict(deepcopy(minimal_document), index=f"{title}\n\nText.")
+        doc.set_parts(user_slug, random_slug("test-doc-"), parts)
+        doc_slugs.append(doc.save(pregenerate=False, update_doc_slug=True))
+    assert doc_slugs == ["first", "second", "third"]
+
+    renamed = Document(data)
+    renamed.set_host("http://example.org")
+    renamed.set_parts(user_slug, "old-slug", deepcopy(minimal_document))
+    renamed.save(pregenerate=False, update_doc_slug=False)
+
+    data.epubCache_set(user_slug, doc_slugs[0], b"epub")
+
+    messages = []
+    count = refresh_all(data, "http://example.org", 2, messages.append)
+    assert count == 4
+    assert len(messages) == 4
+
+    for doc_slug in doc_slugs + ["example-document"]:
+        assert data.userDocumentCache_exists(user_slug, doc_slug)
+        assert data.userDocumentMetadata_exists(user_slug, doc_slug)
+        assert data.userDocumentDependencies_get(user_slug, doc_slug) != {}
+    assert not data.userDocumentSet_exists(user_slug, "old-slug")
+    assert not data.epubCache_exists(user_slug, doc_slugs[0])
@@ -4,17 +4,51 @@ Article Wiki.
 Cross References placeholders.
 """
 
-from typing import Dict, Tuple
+import threading
+
+from typing import Dict, List, Tuple
 from airium import Airium
 from html import escape
 from refspy import refspy
-from refspy.manager import Reference
+from refspy.manager import Manager, Reference
 from refspy.utils import sequential_replace_tuples
 
+from lib.wiki.cache import RenderCache, content_key
+
 # High Voltage U+26a1; special marker. Same as placeholders.
 # Should have been stripped from all wiki source texts
 DELIMITER = "⚡"
 
+# Reference matches per part, keyed by a hash of the part's text.
+REFERENCES_CACHE = RenderCache(maxsize=10_000)
+
+REFSPY = None  # <-- See get_refspy()
+REFSPY_LOCK = threading.Lock()
+
+
+def get_refspy() -> Manager:
+    """
+    The shared refspy manager, built on first use; it is only read after that.
+    """
+    global REFSPY
+    if REFSPY is None:
+        with REFSPY_LOCK:
+            if REFSPY is None:
+                REFSPY = refspy()
+    return REFSPY
+
+
+def find_references(text: str) -> List[tuple]:
+    """
+    refspy's find_references(text, include_nones=True), cached by content.
+    """
+    key = content_key("references", text)
+    matches = REFERENCES_CACHE.get(key)
+    if matches is None:
+        matches = tuple(get_refspy().find_references(text, include_nones=True))
+        REFERENCES_CACHE.set(key, matches)
+    return list(matches)
+
 
 class BibleReferences:
     """
@@ -25,7 +59,7 @@ class BibleReferences:
         """
         Create refs list for bible references.
         """
-        self.refspy = refspy()
+        self.refspy = get_refspy()
         self.refs = {}
         self.placeholders = []
         self.outline = outline
@@ -42,10 +76,7 @@ class BibleReferences:
         assert all([isinstance(_, str) for _ in list(parts.keys())])
         assert all([isinstance(_, str) for _ in parts])
 
-        self.refs = {
-            key: self.refspy.find_references(text, include_nones=True)
-            for key, text in parts.items()
-        }
+        self.refs = {key: find_references(text) for key, text in parts.items()}
         safe_parts = {}
         for slug, text in parts.items():
             tuples = []
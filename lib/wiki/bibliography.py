@@ -6,14 +6,19 @@ Manage a simple bibliography list, of full-line records.
 
 import re
 
-from jinja2 import Environment
+from functools import lru_cache
 from sortedcontainers import SortedDict
 
 from lib.slugs import slug
 from lib.wiki.counters import Letters, Symbols
 from lib.wiki.geometry import get_words
-from lib.wiki.inline import Inline, strip_markup
+from lib.wiki.inline import get_inline, strip_markup
 from lib.wiki.outline import Outline
+from lib.wiki.templates import register
+
+# Plain words between single spaces or commas, that inline markup leaves
+# alone (note that "2x3" becomes "2&times;3").
+PLAIN_CITATION = re.compile(r"(?!.*\dx\d)[^\W_]+(?:,? [^\W_]+)*")
 
 
 class Bibliography(object):
@@ -46,12 +51,17 @@ class Bibliography(object):
         self.outline = outline
         self.entries = collate_bibliography(parts)
 
+        self.labels = list(self.entries)  # <-- In SortedDict order
+        self.words = None  # <-- {word: {positions}}, built on first match
+        self.terms = {}  # <-- {term: {positions}}
+        self.matches = {}  # <-- {citation: label}
+
         self.id_prefix = id_prefix
 
         self.citations = {}
         self.counters = {}
 
-        self.inline = Inline()
+        self.inline = get_inline()
 
     def __iter__(self):
         """
@@ -65,14 +75,47 @@ class Bibliography(object):
         words in the citation. Note that citation is assumed to be the first
         part of ((Citation, Note)) before the comma, so we're not matching page
         numbers or comments.
+
+        Each term need only be a substring of the label or entry text, so
+        "hay" matches "Hays". Results are kept per citation.
         """
-        terms = get_words(strip_markup(citation))
-        for label in self.entries:
-            entry = self.entries[label]
-            lowercase_entry = label.lower() + " " + entry.lower()
-            if all([_ in lowercase_entry for _ in terms]):
-                return label
-        return default
+        if citation not in self.matches:
+            positions = self.match_positions(citation_terms(citation))
+            self.matches[citation] = self.labels[min(positions)] if positions else None
+        label = self.matches[citation]
+        return default if label is None else label
+
+    def match_positions(self, terms):
+        """
+        Return the positions of the entries containing every term, from the
+        smallest posting set up.
+        """
+        if self.words is None:
+            self.words = index_words(self.labels, self.entries)
+        if not terms:
+            return {0} if self.labels else set()
+        postings = sorted(
+            [self.term_positions(term) for term in set(terms)], key=len
+        )
+        positions = set(postings[0])
+        for posting in postings[1:]:
+            positions &= posting
+            if not positions:
+                break
+        return positions
+
+    def term_positions(self, term):
+        """
+        Entry positions for one term: the union of the postings of every
+        indexed word containing it.
+        """
+        if term not in self.terms:
+            positions = set()
+            for word, posting in self.words.items():
+                if term in word:
+                    positions |= posting
+            self.terms[term] = positions
+        return self.terms[term]
 
     def get_count(self, part_slug):
         """
@@ -160,43 +203,7 @@ class Bibliography(object):
         """
         assert isinstance(self.entries, dict)
 
-        env = Environment(autoescape=True)
-        tpl = env.from_string(
-            """
-            {% if entries|length > 0 %}
-            <section id="{{ id_prefix }}-bibliography" class="bibliography">
-            <div class="section-content">
-            {% if not single_page %}
-                <h1>
-                    <a href="#{{ id_prefix }}-bibliography">Bibliography</a>
-                </h1>
-            {% endif %}
-            {% for label in entries %}
-                <div class="indent-hanging">
-                    {{ label }}&nbsp; {{ entries[label] }}
-                    {% if label in citations %}
-                        <span class="wiki-no-select">
-                        {% for number in citations[label] %}
-                            {% if not single_page %}
-                            <b>{{ number }}.</b>
-                            {% endif %}
-                            ({{
-                                citations[label][number] | join(', ') | safe
-                            }}).
-                        {% endfor %}
-                        </span>
-                    {% endif %}
-                </div>
-            {% endfor %}
-            {#
-            <pre>{{ entries | tojson }}</pre>
-            <pre>{{ citations | tojson }}</pre>
-            #}
-            </div>
-            </section>
-            {% endif %}
-            """
-        )
+        tpl = BIBLIOGRAPHY_TEMPLATE
 
         if not self.entries:
             return ""
@@ -213,6 +220,30 @@ class Bibliography(object):
 # -----------------
 
 
+@lru_cache(maxsize=4096)
+def citation_terms(citation):
+    """
+    The lowercase words of a citation, as get_words(strip_markup(citation)).
+    Plain citations, like "Author 2000", skip the inline renderer.
+    """
+    if PLAIN_CITATION.fullmatch(citation):
+        return tuple(get_words(citation))
+    return tuple(get_words(strip_markup(citation)))
+
+
+def index_words(labels, entries):
+    """
+    Map each lowercase word of the bibliography to the positions of the
+    entries containing it (in labels or text).
+    """
+    words = {}
+    for position, label in enumerate(labels):
+        text = label.lower() + " " + entries[label].lower()
+        for word in re.findall(r"\w+", text):
+            words.setdefault(word, set()).add(position)
+    return words
+
+
 def get_number(numbering):
     """
     Take array of ['x', 'y', 'z']; return 'x.y.z'.
@@ -312,3 +343,46 @@ def create_unique_labels(lines):
                 if len(head) > 0:
                     unique_labels[head[:-1] + next(counter) + head[-1]] = tail
     return unique_labels
+
+
+# ---------
+# Templates
+# ---------
+
+BIBLIOGRAPHY_TEMPLATE = register(
+    "bibliography",
+    """
+            {% if entries|length > 0 %}
+            <section id="{{ id_prefix }}-bibliography" class="bibliography">
+            <div class="section-content">
+            {% if not single_page %}
+                <h1>
+                    <a href="#{{ id_prefix }}-bibliography">Bibliography</a>
+                </h1>
+            {% endif %}
+            {% for label in entries %}
+                <div class="indent-hanging">
+                    {{ label }}&nbsp; {{ entries[label] }}
+                    {% if label in citations %}
+                        <span class="wiki-no-select">
+                        {% for number in citations[label] %}
+                            {% if not single_page %}
+                            <b>{{ number }}.</b>
+                            {% endif %}
+                            ({{
+                                citations[label][number] | join(', ') | safe
+                            }}).
+                        {% endfor %}
+                        </span>
+                    {% endif %}
+                </div>
+            {% endfor %}
+            {#
+            <pre>{{ entries | tojson }}</pre>
+            <pre>{{ citations | tojson }}</pre>
+            #}
+            </div>
+            </section>
+            {% endif %}
+            """,
+)
@@ -21,7 +21,6 @@ from airium import Airium
 from textwrap import shorten
 
 from copy import copy
-from jinja2 import Environment
 
 from lib.slugs import slug
 
@@ -62,10 +61,16 @@ from lib.wiki.renderer import (
     tag,
 )
 
+from lib.wiki.cache import RenderCache, content_key
 from lib.wiki.placeholders import is_placeholder
-from lib.wiki.inline import Inline
+from lib.wiki.inline import get_inline
+from lib.wiki.templates import register
 from lib.wiki.utils import clean_text, one_line, random_slug, split_options, trim
 
+# Rendered blocks whose HTML depends only on their own text; the size is
+# measured in characters of HTML. Set BLOCK_CACHE.enabled = False to bypass.
+BLOCK_CACHE = RenderCache(maxsize=10_000_000, getsizeof=len)
+
 
 class BlockList(object):
     """
@@ -207,6 +212,15 @@ class BlockList(object):
             ]
         )
 
+    def cacheable(self) -> bool:
+        """
+        Confirm that rendering depends only on the text and settings (e.g. no
+        ARTICLES blocks, which read other documents).
+        """
+        return all(
+            _.cacheable() for _ in self.blocks if isinstance(_, FunctionBlock)
+        )
+
     def find(self, class_name, control_characters: Optional[str] = None) -> list:
         """
         A quick way to filter for block types (more than one, e.g. "+-").
@@ -381,7 +395,7 @@ class BlockList(object):
         header, body, footer = self.split_body()
         if header and header.blocks:
             for _ in header.blocks:
-                block_html, local_settings = _.html(renderer, local_settings)
+                block_html, local_settings = _.cached_html(renderer, local_settings)
                 header_parts += block_html
 
         if not fragment:
@@ -393,7 +407,7 @@ class BlockList(object):
                     )
             if footer and footer.blocks:
                 for _ in footer.blocks:
-                    block_html, local_settings = _.html(renderer, local_settings)
+                    block_html, local_settings = _.cached_html(renderer, local_settings)
                     footer_parts += block_html
 
         if len(header_parts) > 0:
@@ -404,7 +418,7 @@ class BlockList(object):
             html += "</header>"
 
         for _ in body.blocks:
-            block_html, local_settings = _.html(renderer, local_settings)
+            block_html, local_settings = _.cached_html(renderer, local_settings)
             html += block_html
 
         if len(footer_parts) > 0:
@@ -450,6 +464,26 @@ class Block:
         (html, settings) = self.html(renderer, settings)
         return html
 
+    def memo_key(self) -> Optional[str]:
+        """
+        A key for BLOCK_CACHE, or None if the HTML may depend on settings
+        (or change them).
+        """
+        return None
+
+    def cached_html(self, renderer, settings):
+        """
+        Like html(), but reuse the HTML of an identical block if possible.
+        """
+        key = self.memo_key()
+        if key is None:
+            return self.html(renderer, settings)
+        html = BLOCK_CACHE.get(key)
+        if html is None:
+            html, settings = self.html(renderer, settings)
+            BLOCK_CACHE.set(key, html)
+        return (html, settings)
+
 
 class Paragraph(Block):
     """
@@ -465,6 +499,12 @@ class Paragraph(Block):
         "For paragraphs there is only one line to wrap."
         return self.content
 
+    def memo_key(self) -> Optional[str]:
+        "Settings values ($[...]) are the only context."
+        if "$[" in self.content:
+            return None
+        return content_key("Paragraph", self.content)
+
     def html(self, renderer, settings):
         "Just wrap in a paragraph tag (with inline formatting)."
         if is_placeholder(self.content):
@@ -569,6 +609,16 @@ class CharacterBlock(Block):
         space_above = "\n" if self.control_character in Config.subheads else ""
         return space_above + "\n".join(lines)
 
+    def memo_key(self) -> Optional[str]:
+        """
+        Settings blocks and lists (which count with NUMBERING and CONTINUE)
+        read and change the settings.
+        """
+        _ = self.control_character
+        if _ in Config.setters or _ in Config.lists or "$[" in self.content:
+            return None
+        return content_key("CharacterBlock", self.content)
+
     def html(self, renderer, settings):
         """
         Call the right layout function from the renderer...
@@ -631,6 +681,26 @@ class FunctionBlock(Block):
         if issubclass(self.function_class, Wrapper):
             self.blocks = BlockList(self.content)
 
+    def cacheable(self) -> bool:
+        """
+        Wrappers are cacheable if their contents are.
+        """
+        if issubclass(self.function_class, Wrapper):
+            return self.blocks.cacheable()
+        return self.function_class.cacheable
+
+    def memo_key(self) -> Optional[str]:
+        """
+        The contents of wrappers are memoized as blocks in their own right.
+        """
+        if issubclass(self.function_class, Wrapper):
+            return None
+        if not self.function_class.cacheable or self.function_class.reads_settings:
+            return None
+        return content_key(
+            "FunctionBlock", self.function_class.__name__, self.options, self.content
+        )
+
     def text(self):
         """
         Canonical form is almost the same as required form.
@@ -690,6 +760,8 @@ class Grid(Function):
     +++
     """
 
+    reads_settings = True  # <-- Cells are rendered with renderer.settings.
+
     def html(self, renderer):
         html_rows = []
         for row in [row.strip() for row in self.text.split("===")]:
@@ -701,24 +773,7 @@ class Grid(Function):
                 html_cells.append(html)
             html_rows.append(html_cells)
 
-        env = Environment(autoescape=True)
-        tpl = env.from_string(
-            trim(
-                """
-            <table class="table table-condensed">
-            <tbody>
-            {% for html_row in html_rows %}
-                <tr>
-                    {% for html_cell in html_row %}
-                    <td>{{ html_cell|safe }}</td>
-                    {% endfor %}
-                </tr>
-            {% endfor %}
-            </tbody>
-            </table>
-        """
-            )
-        )
+        tpl = GRID_TEMPLATE
 
         return tpl.render(html_rows=html_rows)
 
@@ -880,7 +935,7 @@ def list_block(text, settings):
         $ NUMBERING = ... is the next item to count from.
         $ CONTINUE = ... is the count to use if NUMBERING = continue
         """
-        inline = Inline()
+        inline = get_inline()
         list_tag = "ol" if char == "#" else "ul"
         properties = [""]
         if list_tag == "ol" and depth == 1:
@@ -956,7 +1011,7 @@ def quiz_block(text, settings):
     """
     Build HTML from text.
     """
-    inline = Inline()
+    inline = get_inline()
     q_html, a_html = [], []
     for char, line in split_to_array(text, "?=", capture_characters=True):
         if char == "?":
@@ -982,7 +1037,7 @@ def gloss_block(text, settings):
     """
     Build HTML from text.
     """
-    inline = Inline()
+    inline = get_inline()
     char = text[0]  # '/', as used here
     gloss = []
     num = None
@@ -999,10 +1054,50 @@ def gloss_block(text, settings):
             else:
                 gloss += [[(source_html, translations_html)]]
 
-    env = Environment(autoescape=True)
-    tpl = env.from_string(
-        trim(
-            """
+    tpl = GLOSS_TEMPLATE
+
+    return tpl.render(gloss=gloss)
+
+
+def table_block(text, settings):
+    """
+    Generate simple tables.
+    """
+    char = text[0]
+    divisions = split_to_array(text, Config.tables, capture_characters=False)
+    has_headers = char == "!"
+    data, options = parse_table_data(divisions, has_headers)
+    return generate_table(data, options)
+
+
+# ---------
+# Templates
+# ---------
+
+GRID_TEMPLATE = register(
+    "grid",
+    trim(
+        """
+        <table class="table table-condensed">
+        <tbody>
+        {% for html_row in html_rows %}
+            <tr>
+                {% for html_cell in html_row %}
+                <td>{{ html_cell|safe }}</td>
+                {% endfor %}
+            </tr>
+        {% endfor %}
+        </tbody>
+        </table>
+        """
+    ),
+)
+
+
+GLOSS_TEMPLATE = register(
+    "gloss",
+    trim(
+        """
         <div class="gloss">
         {% for translation_group in gloss %}
             <div class="phrase-group">
@@ -1017,19 +1112,6 @@ def gloss_block(text, settings):
             </div>
         {% endfor %}
         </div>
-    """
-        )
-    )
-
-    return tpl.render(gloss=gloss)
-
-
-def table_block(text, settings):
-    """
-    Generate simple tables.
-    """
-    char = text[0]
-    divisions = split_to_array(text, Config.tables, capture_characters=False)
-    has_headers = char == "!"
-    data, options = parse_table_data(divisions, has_headers)
-    return generate_table(data, options)
+        """
+    ),
+)
@@ -0,0 +1,90 @@
+"""
+Article Wiki: Render caches.
+
+Rendering is a pure function of its inputs for most of the wiki, so rendered
+fragments can be stored against a hash of everything that went into them and
+reused across renders (saves, previews, refreshes) within a process. A
+RenderCache is a bounded LRU that is safe to share between threads.
+
+> cache = RenderCache(maxsize=1000)
+> key = content_key("section", numbering, slug, text)
+> html = cache.get(key)
+> if html is None:
+>     html = render(...)
+>     cache.set(key, html)
+"""
+
+import hashlib
+import threading
+
+from typing import Any, Callable, Optional
+
+from cachetools import LRUCache
+
+
+class RenderCache(object):
+    """
+    A thread-safe, bounded LRU cache with hit/miss counters.
+
+    If getsizeof is given, maxsize is measured in its units (e.g. characters
+    of HTML) rather than in entries.
+    """
+
+    def __init__(self, maxsize: int, getsizeof: Optional[Callable] = None):
+        self.maxsize = maxsize
+        self.getsizeof = getsizeof
+        self.cache = LRUCache(maxsize, getsizeof=getsizeof)
+        self.lock = threading.Lock()
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.cache)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.cache
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Return a stored value (marking it recently used), or the default.
+        """
+        if not self.enabled:
+            return default
+        with self.lock:
+            try:
+                value = self.cache[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        """
+        Store a value; values too large for the whole cache are skipped.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            try:
+                self.cache[key] = value
+            except ValueError:
+                pass  # <-- Value too large
+
+    def clear(self):
+        """
+        Drop all entries and reset counters.
+        """
+        with self.lock:
+            self.cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def content_key(*items) -> str:
+    """
+    Hash a tuple of render inputs (strings, numbers, lists) into a key.
+    """
+    return hashlib.sha1(repr(items).encode("utf-8")).hexdigest()
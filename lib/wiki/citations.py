@@ -18,12 +18,16 @@ class Citations(object):
     Manage citations of the bibliography.
     """
 
-    def __init__(self, bibliography):
+    def __init__(self, bibliography, dependencies=None):
         """
         Create bibliography entries, and setup placeholder identifiers.
+
+        If a Dependencies object is given, record which bibliography entry
+        each citation resolves to.
         """
         assert isinstance(bibliography, Bibliography)
         self.bibliography = bibliography
+        self.dependencies = dependencies
 
         regex = r"~\[[^\)]+?\][%s]?" % re.escape(Config.punctuation)
         self.placeholders = Placeholders(regex, "citation")
@@ -49,11 +53,13 @@ class Citations(object):
         numbering = self.bibliography.outline.find_numbering(part_slug)
         citation, note, punctuation = split_pattern(pattern)
         if self.ibid and slug(citation) == "ibid":
+            self.depends(part_slug, citation, self.ibid)
             index = self.bibliography.get_count(part_slug)
             return self.bibliography.citation(
                 citation, note, punctuation, self.ibid, numbering, index
             )
         label = self.bibliography.match(citation)
+        self.depends(part_slug, citation, label)
         if label:
             self.ibid = label
             index = self.bibliography.get_count(part_slug)
@@ -72,6 +78,13 @@ class Citations(object):
         """
         return self.placeholders.replace(self.decorate, html_parts)
 
+    def depends(self, part_slug, citation, label):
+        """
+        Record the bibliography label that a citation resolved to, if any.
+        """
+        if self.dependencies is not None:
+            self.dependencies.add(part_slug, "citation", citation, label)
+
 
 # ---------
 # Utilities
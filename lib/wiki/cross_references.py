@@ -16,9 +16,12 @@ class CrossReferences(object):
     Manage internal links within a document.
     """
 
-    def __init__(self, parts, outline):
+    def __init__(self, parts, outline, dependencies=None):
         """
         Create contents list, replace cross-references with placeholders.
+
+        If a Dependencies object is given, record which section each
+        cross-reference resolves to.
         """
 
         assert isinstance(parts, dict)
@@ -29,6 +32,7 @@ class CrossReferences(object):
         self.regex = r"\@\[[^\]]+\][.,!?;:·]?"
         self.placeholders = Placeholders(self.regex, "cr")
         self.outline = outline
+        self.dependencies = dependencies
 
     def insert(self, parts):
         """
@@ -40,27 +44,31 @@ class CrossReferences(object):
         """
         Find first title that contains ALL terms.
         """
-        terms = get_words(pattern)
-        for numbering, slug, title, title_slug, _ in self.outline:
-            title_terms = get_words(title)
-            # Require all given terms to match the title.
-            # print set(terms), set(title_terms), set(terms) < set(title_terms)
-            if set(terms) <= set(title_terms):
-                section = ".".join(str(i) for i in numbering)
-                slug = section + "_" + slug
-                # leading '-' for short form
-                if pattern[2] == "-":
-                    fmt = '<a class="unmarked" href="#%s">&sect;%s</a>'
-                    link = fmt % (slug, section)
-                else:
-                    fmt = '<a class="unmarked" href="#%s"><i>%s</i> (&sect;%s)</a>'
-                    link = fmt % (slug, title.strip(), section)
-                # trailing punctuation
-                if pattern[-1] in ",.?!:;·":
-                    link += pattern[-1]
-                return link
-        error = '<kbd class="wiki-error">%s</kbd>'
-        return error % escape(pattern)
+        element = self.outline.match_title(get_words(pattern))
+        if element is None:
+            if self.dependencies is not None:
+                self.dependencies.add(part_slug, "section", pattern)
+            error = '<kbd class="wiki-error">%s</kbd>'
+            return error % escape(pattern)
+
+        numbering, slug, title, title_slug, _ = element
+        if self.dependencies is not None:
+            self.dependencies.add(
+                part_slug, "section", pattern, (numbering, slug, title)
+            )
+        section = ".".join(str(i) for i in numbering)
+        slug = section + "_" + slug
+        # leading '-' for short form
+        if pattern[2] == "-":
+            fmt = '<a class="unmarked" href="#%s">&sect;%s</a>'
+            link = fmt % (slug, section)
+        else:
+            fmt = '<a class="unmarked" href="#%s"><i>%s</i> (&sect;%s)</a>'
+            link = fmt % (slug, title.strip(), section)
+        # trailing punctuation
+        if pattern[-1] in ",.?!:;·":
+            link += pattern[-1]
+        return link
 
     def replace(self, html_parts):
         """
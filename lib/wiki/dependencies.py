@@ -0,0 +1,97 @@
+"""
+Article Wiki: Dependencies between parts.
+
+Cross-references, citations and the table of contents read across every part
+of a document, so a change to one part can change the HTML of others. While
+processing, the wiki records what each section depended on, and what each
+dependency resolved to:
+
+> dependencies.source("part-one", ["1"], text, settings.fingerprint())
+> dependencies.add("part-one", "section", "part-two", (["2"], "Part Two"))
+> dependencies.add("part-one", "citation", "Calvin 1559", entry)
+
+A section's fingerprint covers its own text and the values it resolved, so
+comparing fingerprints with those of a previous render gives the smallest set
+of sections whose HTML really changed:
+
+> changed = wiki.dependencies.changed(previous_fingerprints)
+"""
+
+from typing import Dict, List, Set, Tuple
+
+from lib.wiki.cache import content_key
+
+
+class Dependencies(object):
+    """
+    A graph of sections and the targets (sections, bibliography entries) they
+    refer to.
+    """
+
+    def __init__(self):
+        self.sources = {}  # <-- {slug: key of own text, numbering, settings}
+        self.edges = {}  # <-- {slug: {(kind, target): resolved value}}
+
+    def __len__(self):
+        return len(self.sources)
+
+    def source(self, slug: str, numbering: List[str], text: str, settings: str):
+        """
+        Record the inputs of a section that are its own.
+        """
+        self.sources[slug] = content_key(numbering, text, settings)
+        if slug not in self.edges:
+            self.edges[slug] = {}
+
+    def add(self, slug: str, kind: str, target: str, value=None):
+        """
+        Record that a section used a target, and what it resolved to (e.g. a
+        cross-reference resolves to a numbering and title). Unresolved targets
+        have a value of None.
+        """
+        if slug not in self.edges:
+            self.edges[slug] = {}
+        self.edges[slug][(kind, target)] = value
+
+    def targets(self, slug: str) -> List[Tuple[str, str]]:
+        """
+        List the (kind, target) pairs that a section refers to.
+        """
+        return sorted(self.edges.get(slug, {}).keys(), key=repr)
+
+    def dependents(self, kind: str, target: str) -> List[str]:
+        """
+        List the sections that refer to a target.
+        """
+        return [
+            slug for slug, edges in self.edges.items() if (kind, target) in edges
+        ]
+
+    def fingerprint(self, slug: str) -> str:
+        """
+        A key that changes whenever the section's HTML may have changed.
+        """
+        edges = sorted(self.edges.get(slug, {}).items(), key=repr)
+        return content_key(self.sources.get(slug), edges)
+
+    def fingerprints(self) -> Dict[str, str]:
+        """
+        Fingerprints for all sections, e.g. to store with the document cache.
+        """
+        slugs = set(self.sources.keys()) | set(self.edges.keys())
+        return {slug: self.fingerprint(slug) for slug in sorted(slugs)}
+
+    def changed(self, previous: Dict[str, str]) -> Set[str]:
+        """
+        Compare with the fingerprints of an earlier render; return the slugs
+        of sections that were added, removed, or may render differently.
+        """
+        return changed_fingerprints(self.fingerprints(), previous)
+
+
+def changed_fingerprints(current: Dict[str, str], previous: Dict[str, str]) -> Set[str]:
+    """
+    The slugs of sections whose fingerprints differ between two renders.
+    """
+    slugs = set(current.keys()) | set(previous.keys())
+    return {_ for _ in slugs if current.get(_) != previous.get(_)}
@@ -4,15 +4,15 @@ Construct footnotes from ^[Links] in document parts.
 
 import re
 
-from jinja2 import Environment
 from sortedcontainers import SortedDict
 
 from lib.wiki.blocks import BlockList
 from lib.wiki.config import Config
 from lib.wiki.counters import Numbers
 from lib.wiki.geometry import split_to_array
-from lib.wiki.inline import Inline, strip_markup
+from lib.wiki.inline import get_inline, strip_markup
 from lib.wiki.outline import Outline
+from lib.wiki.templates import register
 from lib.wiki.utils import trim
 
 
@@ -38,7 +38,7 @@ class Footnotes(object):
 
         self.id_prefix = id_prefix
 
-        self.inline = Inline()
+        self.inline = get_inline()
         self.counters = {}
 
     def collate_footnotes(self, parts):
@@ -169,7 +169,7 @@ class Footnotes(object):
         """
         Render a lit of footnotes for the entire document.
 
-        TODO: This has been obsoleted by self.html_parts() now; retaining here
+        TODO: This has been obsoleted by self.html_part() now; retaining here
         as a reminder to consider a SETTING that allows either per-section or
         end-of-document footnotes.
         """
@@ -177,54 +177,20 @@ class Footnotes(object):
         for _ in list(self.backlinks.items()):
             assert isinstance(_, tuple)
 
-        env = Environment(autoescape=True)
-        tpl = env.from_string(
-            """
-            <footer id="{{ id_prefix }}-footnotes">
-            {% if backlinks|length < 2 %}
-                {% for number, entries in backlinks %}
-                    {% for count, (ref_link, ref_text) in entries %}
-                <div class="footnote-item">
-                    <sup>{{ ref_link|safe }}</sup> {{ ref_text|safe }}
-                </div>
-                    {% endfor %}
-                {% endfor %}
-            {% else %}
-                <h1><a href="#{{ id_prefix }}-footnotes">Footnotes</a></h1>
-                {% for number, entries in backlinks %}
-                <div class="no-widows">
-                    <div class="footnote-title"><b>{{ number }}</b></div>
-                {% for count, (ref_link, ref_text) in entries %}
-                    <div class="footnote-item">
-                        <sup>{{ ref_link|safe }}</sup> {{ ref_text|safe }}
-                    </div>
-                {% endfor %}
-                </div>
-                {% endfor %}
-            {% endif %}
-            </footer>
-            """
-        )
+        tpl = FOOTNOTES_TEMPLATE
 
         if len(self.backlinks) == 0:
             return ""
         else:
             return tpl.render(backlinks=list(self.sort()), id_prefix=self.id_prefix)
 
-    def html_parts(self) -> list:
+    def html_part(self, number: str) -> str:
         """
-        Retrieve the HTML for each section, in a dictionary
+        Retrieve the HTML for one section, by its number (e.g. '1.2').
         """
-        parts = {}
-        backlinks = list(self.sort())
-        for number, entries in backlinks:
-            numbering = number.split(".")
-            slug = self.outline.find_slug(numbering)
-            parts[slug] = ""
-            for _, (ref_link, ref_text) in entries:
-                pattern = '<div class="footnote-item"><sup>%s</sup> %s</div>'
-                parts[slug] += pattern % (ref_link, ref_text)
-        return parts
+        section = self.backlinks.get(number, {})
+        pattern = '<div class="footnote-item"><sup>%s</sup> %s</div>'
+        return "".join(pattern % section[_] for _ in sorted(section, key=int))
 
 
 # -----------------
@@ -288,3 +254,37 @@ def split_pattern(pattern):
         link_markup = pattern[2:-1]
         punctuation = ""
     return (link_markup, punctuation)
+
+
+# ---------
+# Templates
+# ---------
+
+FOOTNOTES_TEMPLATE = register(
+    "footnotes",
+    """
+            <footer id="{{ id_prefix }}-footnotes">
+            {% if backlinks|length < 2 %}
+                {% for number, entries in backlinks %}
+                    {% for count, (ref_link, ref_text) in entries %}
+                <div class="footnote-item">
+                    <sup>{{ ref_link|safe }}</sup> {{ ref_text|safe }}
+                </div>
+                    {% endfor %}
+                {% endfor %}
+            {% else %}
+                <h1><a href="#{{ id_prefix }}-footnotes">Footnotes</a></h1>
+                {% for number, entries in backlinks %}
+                <div class="no-widows">
+                    <div class="footnote-title"><b>{{ number }}</b></div>
+                {% for count, (ref_link, ref_text) in entries %}
+                    <div class="footnote-item">
+                        <sup>{{ ref_link|safe }}</sup> {{ ref_text|safe }}
+                    </div>
+                {% endfor %}
+                </div>
+                {% endfor %}
+            {% endif %}
+            </footer>
+            """,
+)
@@ -13,8 +13,8 @@ from airium import Airium
 from html import escape
 from jinja2 import Environment
 
-from lib.data import Data, load_env_config
-from lib.wiki.inline import Inline
+from lib.data import get_data, load_env_config
+from lib.wiki.inline import get_inline
 from lib.wiki.renderer import wrap
 from lib.wiki.utils import trim
 
@@ -24,6 +24,9 @@ class Function(object):
     Base class for all function objects, which render text.
     """
 
+    cacheable = True  # <-- Output depends only on options and text.
+    reads_settings = False  # <-- True if output also depends on settings.
+
     def __init__(self, options, text):
         "Standard setup."
         self.options = options  # <-- list
@@ -96,6 +99,8 @@ class Articles(Function):
     Allow $[ADMIN_USER] in articles lists.
     """
 
+    cacheable = False  # <-- Reads other documents' metadata.
+
     examples = [
         trim(
             """
@@ -107,20 +112,19 @@ class Articles(Function):
     ]
 
     def html(self, renderer):
-        config = load_env_config()
-        data = Data(config)
-        inline = Inline()
+        data = get_data()
+        inline = get_inline()
 
         text = self.text.replace("$[ADMIN_USER]", data.admin_user)
 
-        articles = []
+        keys = []
         for line in text.splitlines():
             parts = line.split("/")
             if len(parts) == 2:
                 user_slug, doc_slug = parts
-                metadata = data.userDocumentMetadata_get(user_slug, doc_slug)
-                if metadata:
-                    articles += [metadata]
+                key = data.userDocumentMetadata_key(user_slug, doc_slug)
+                keys.append((line, key))
+        articles = [metadata for _, metadata in data.hashes_iter(keys) if metadata]
 
         if len(articles) == 0:
             return ""
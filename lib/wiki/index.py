@@ -2,11 +2,11 @@
 Construct an index from #Tags in document parts.
 """
 
-from jinja2 import Environment
 from lib.slugs import slug
 
 from lib.wiki.counters import RomanNumerals
 from lib.wiki.outline import Outline
+from lib.wiki.templates import register
 from lib.wiki.utils import one_line, trim
 
 
@@ -98,35 +98,7 @@ class Index(object):
         """
         assert isinstance(self.tags, dict)
 
-        env = Environment(autoescape=True)
-        tpl = env.from_string(
-            trim(
-                """
-            <section id="index">
-            {% if not single_page %}
-                <h1><a href="#index">Index</a></h1>
-            {% endif %}
-            <div class="columns-x3">
-            {% for tag, subtags in tags %}
-                <div class="no-column-break">
-                    <div class="indent-hanging">
-                        {{ tag }}
-                    </div>
-                    {% for subtag, numbers in subtags %}
-                    <div class="indent-first-line">{{ subtag }}
-                        {% for number, links in numbers %}
-                        <b>{{ number }}</b>
-                        {{ links | join(', ') | safe }}.
-                        {% endfor %}
-                    </div>
-                    {% endfor %}
-                </div>
-            {% endfor %}
-            </div>
-            </section>
-            """
-            )
-        )
+        tpl = INDEX_TEMPLATE
 
         if len(self.tags) == 0:
             return ""
@@ -160,3 +132,38 @@ def get_nav_id(tag, subtag, numbering, count):
     number = get_number(numbering)
     items = [_ for _ in [slug(tag), slug(subtag), number, str(count)] if _ != ""]
     return "_".join(items)
+
+
+# ---------
+# Templates
+# ---------
+
+INDEX_TEMPLATE = register(
+    "index",
+    trim(
+        """
+        <section id="index">
+        {% if not single_page %}
+            <h1><a href="#index">Index</a></h1>
+        {% endif %}
+        <div class="columns-x3">
+        {% for tag, subtags in tags %}
+            <div class="no-column-break">
+                <div class="indent-hanging">
+                    {{ tag }}
+                </div>
+                {% for subtag, numbers in subtags %}
+                <div class="indent-first-line">{{ subtag }}
+                    {% for number, links in numbers %}
+                    <b>{{ number }}</b>
+                    {{ links | join(', ') | safe }}.
+                    {% endfor %}
+                </div>
+                {% endfor %}
+            </div>
+        {% endfor %}
+        </div>
+        </section>
+        """
+    ),
+)
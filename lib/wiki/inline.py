@@ -4,6 +4,8 @@ Inline wiki markup; typography and brackets.
 
 import re
 
+from functools import lru_cache
+
 from bleach import clean
 
 from lib.wiki.icons import Icons
@@ -11,6 +13,89 @@ from lib.wiki.shorthand import Shorthand
 from lib.wiki.utils import html_escape
 
 
+# -------------------------------------------------------
+# Typography: compiled once, and applied in this order.
+# -------------------------------------------------------
+
+URL_CHARS = re.escape(r".:\/_+?&=-#%~")
+
+# Fixed strings with no overlaps between them, so one alternation can replace
+# them all in a single pass; the longest are tried first.
+SYMBOLS = {
+    "(1/2)": "&frac12;",
+    "(1/4)": "&frac14;",
+    "(3/4)": "&frac34;",
+    "...": "&hellip;",
+    "(C)": "&copy;",
+    "(R)": "&reg;",
+    "(TM)": "&trade;",
+    "(D)": "&deg;",
+    # Some text-critical helpfulness
+    "(PPY)": "𝔓",
+    "(MSS)": "𝔐",
+    "(S)": "&#8239;",
+    "(2S)": "&#8239;" * 2,
+    "(4S)": "&#8239;" * 4,
+    "(EN)": "&#8194;",
+    "(2EN)": "&#8194;" * 2,
+    "(4EN)": "&#8194;" * 4,
+    "(EM)": "&#8195;",
+    "(2EM)": "&#8195;" * 2,
+    "(4EM)": "&#8195;" * 4,
+}
+
+SYMBOLS_REGEX = re.compile(
+    "|".join(re.escape(_) for _ in sorted(SYMBOLS, key=len, reverse=True))
+)
+
+
+def replace_symbol(match) -> str:
+    "Look up the entity for a matched symbol."
+    return SYMBOLS[match.group(0)]
+
+
+MARKUP_TUPLES = [
+    # (re.compile(r"--&gt;"), "s⇐"),
+    # (re.compile(r"&lt;--"), ""),
+    # en dash between numbers
+    (re.compile(r"(?<=\d)-(?=\d)"), "&ndash;"),
+    (re.compile(r"(?<=\d)x(?=\d)"), "&times;"),
+    (re.compile(r"(^|\s*)---($|\s*)"), "&mdash;"),
+    (re.compile(r"(^|\s*)--($|\s*)"), "\\1&ndash;\\2"),
+    (SYMBOLS_REGEX, replace_symbol),
+    # an apostrophe at the start may trail a ^[link], for example.
+    (re.compile(r"^'s(\W)"), "’\\1"),
+    # Special case: a quote within a bracket ... handle square?
+    (re.compile(r"\('(\S)"), "(‘\\1"),
+    (re.compile(r'\("(\S)'), "(“\\1"),
+    # ‘ ’ “ ”
+    (re.compile(r"(\S)'"), "\\1’"),
+    (re.compile(r"'(\S)"), "‘\\1"),
+    (re.compile(r'(\S)"'), "\\1”"),
+    (re.compile(r'"(\S)'), "“\\1"),
+    (re.compile(r"\\" + "\n"), "<br/>\n"),
+    # Web and email links
+    (
+        re.compile(r"(https?)://([\w%s]+)" % URL_CHARS),
+        '<a href="\\1://\\2">\\1://\\2</a>',
+    ),
+    (
+        re.compile(r"([\w\.\-\_]+)@([\w\.\-\_]+)"),
+        '<a href="mailto:\\1@\\2">\\1@\\2</a>',
+    ),
+    (re.compile(r"\(END\)"), "⬛"),
+]
+
+SENTENCE_END = re.compile(r'(\S+)([!?.][”’"\'\)\]]{0,3})\s+(\S)')
+
+# Shorthand and icons hold only compiled patterns, so one of each is shared.
+SHORTHAND = Shorthand()
+ICONS = Icons()
+
+MEMO_LENGTH = 200  # <-- Titles, names, dates, table cells...
+MEMO_SIZE = 8192
+
+
 class Inline(object):
     """
     Perform inline formatting using combinable bracket
@@ -38,16 +123,28 @@ class Inline(object):
         ("==", '<span class="small-caps">', "</span>"),
     ]
 
+    pattern = re.compile(
+        "[%s]{1,5}\\[" % re.escape("".join(inline_format_characters))
+    )
+
     def __init__(self):
         """
-        Marshall several formatting classes.
+        Marshall several formatting classes. Nothing here changes after
+        import, so instances are safe to share (see get_inline()).
         """
-        chars = "".join(list(self.inline_format_characters.keys()))
-        self.pattern = re.compile("[%s]{1,5}\\[" % re.escape(chars))
-        self.shorthand = Shorthand()
-        self.icons = Icons()
+        self.shorthand = SHORTHAND
+        self.icons = ICONS
 
     def process(self, text: str) -> str:
+        """
+        Short strings recur often (titles, names, dates), so their results
+        are memoized.
+        """
+        if len(text) <= MEMO_LENGTH:
+            return process_memo(text)
+        return self.process_text(text)
+
+    def process_text(self, text: str) -> str:
         """
         Before any other inline formatting happens:
 
@@ -93,7 +190,7 @@ class Inline(object):
         """
         Simple non-recursive parser to match *[...] patterns.
         """
-        out = ""
+        out = []
         length = len(text)
         pos = 0
         while pos < length:
@@ -101,22 +198,22 @@ class Inline(object):
             if match is not None:
                 start = match.start()
                 if start > pos:
-                    out += self.typography(text[pos:start])
+                    out.append(self.typography(text[pos:start]))
                 end = text.find("]", match.end()) + 1
                 if end > 1:
                     part = text[start:end]  # '?[...]'
                     bracket = part.index("[")
                     control = part[0:bracket]
                     body = part[(bracket + 1) : -1]
-                    out += self.brackets(control, body)
+                    out.append(self.brackets(control, body))
                     pos = end
                 else:
-                    out += self.typography(text[pos:])
+                    out.append(self.typography(text[pos:]))
                     pos = length
             else:
-                out += self.typography(text[pos:])
+                out.append(self.typography(text[pos:]))
                 pos = length
-        return out
+        return "".join(out)
 
     def typography(self, text: str) -> str:
         """
@@ -126,7 +223,7 @@ class Inline(object):
         Sentence handling has been removed here due to glitching.
         """
         _ = html_escape(text)
-        for regex, replace in self.get_markup_tuples():
+        for regex, replace in MARKUP_TUPLES:
             _ = regex.sub(replace, _)
         _ = self.shorthand.replace(_)
         _ = self.icons.replace(_)
@@ -137,57 +234,7 @@ class Inline(object):
         """
         All regular typography is done with a set of regex swaps.
         """
-        url_chars = re.escape(r".:\/_+?&=-#%~")
-        return [
-            # (re.compile(r"--&gt;"), "s⇐"),
-            # (re.compile(r"&lt;--"), ""),
-            # en dash between numbers
-            (re.compile(r"(?<=\d)-(?=\d)"), "&ndash;"),
-            (re.compile(r"(?<=\d)x(?=\d)"), "&times;"),
-            (re.compile(r"(^|\s*)---($|\s*)"), "&mdash;"),
-            (re.compile(r"(^|\s*)--($|\s*)"), "\\1&ndash;\\2"),
-            (re.compile(r"\(1\/2\)"), "&frac12;"),
-            (re.compile(r"\(1\/4\)"), "&frac14;"),
-            (re.compile(r"\(3\/4\)"), "&frac34;"),
-            (re.compile(r"\.\.\."), "&hellip;"),
-            (re.compile(r"\(C\)"), "&copy;"),
-            (re.compile(r"\(R\)"), "&reg;"),
-            (re.compile(r"\(TM\)"), "&trade;"),
-            (re.compile(r"\(D\)"), "&deg;"),
-            # Some text-critical helpfulness
-            (re.compile(r"\(PPY\)"), "𝔓"),
-            (re.compile(r"\(MSS\)"), "𝔐"),
-            (re.compile(r"\(S\)"), "&#8239;"),
-            (re.compile(r"\(2S\)"), "&#8239;" * 2),
-            (re.compile(r"\(4S\)"), "&#8239;" * 4),
-            (re.compile(r"\(EN\)"), "&#8194;"),
-            (re.compile(r"\(2EN\)"), "&#8194;" * 2),
-            (re.compile(r"\(4EN\)"), "&#8194;" * 4),
-            (re.compile(r"\(EM\)"), "&#8195;"),
-            (re.compile(r"\(2EM\)"), "&#8195;" * 2),
-            (re.compile(r"\(4EM\)"), "&#8195;" * 4),
-            # an apostrophe at the start may trail a ^[link], for example.
-            (re.compile(r"^'s(\W)"), "’\\1"),
-            # Special case: a quote within a bracket ... handle square?
-            (re.compile(r"\('(\S)"), "(‘\\1"),
-            (re.compile(r'\("(\S)'), "(“\\1"),
-            # ‘ ’ “ ”
-            (re.compile(r"(\S)'"), "\\1’"),
-            (re.compile(r"'(\S)"), "‘\\1"),
-            (re.compile(r'(\S)"'), "\\1”"),
-            (re.compile(r'"(\S)'), "“\\1"),
-            (re.compile(r"\\" + "\n"), "<br/>\n"),
-            # Web and email links
-            (
-                re.compile(r"(https?)://([\w%s]+)" % url_chars),
-                '<a href="\\1://\\2">\\1://\\2</a>',
-            ),
-            (
-                re.compile(r"([\w\.\-\_]+)@([\w\.\-\_]+)"),
-                '<a href="mailto:\\1@\\2">\\1@\\2</a>',
-            ),
-            (re.compile(r"\(END\)"), "⬛"),
-        ]
+        return MARKUP_TUPLES
 
     def brackets(self, char, content, depth=0):
         """
@@ -267,7 +314,25 @@ def space_sentences(text: str) -> str:
         tail, punctuation, head = match.groups()
         return tail + punctuation + "&nbsp; " + head
 
-    return re.sub(r'(\S+)([!?.][”’"\'\)\]]{0,3})\s+(\S)', repl, text)
+    return SENTENCE_END.sub(repl, text)
+
+
+INLINE = Inline()
+
+
+def get_inline() -> Inline:
+    """
+    The shared Inline instance.
+    """
+    return INLINE
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def process_memo(text: str) -> str:
+    """
+    Inline.process() for short strings; see MEMO_LENGTH.
+    """
+    return INLINE.process_text(text)
 
 
 def strip_markup(content):
@@ -276,5 +341,4 @@ def strip_markup(content):
 
     This is effective but inefficient.
     """
-    inline = Inline()
-    return clean(inline.process(content), tags=[], strip=True, strip_comments=True)
+    return clean(INLINE.process(content), tags=[], strip=True, strip_comments=True)
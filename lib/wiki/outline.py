@@ -5,24 +5,37 @@ Outline manager: provide ordered iteration of document parts, also store wiki
 processing errors.
 """
 
-from typing import Generator
+from typing import Generator, NamedTuple, Optional
 
 from html import escape
-from jinja2 import Environment
 from lib.slugs import slug
 
 from lib.wiki.blocks import BlockList, CharacterBlock, get_title_data
 from lib.wiki.counters import new_counter
-from lib.wiki.geometry import split_to_recursive_array
-from lib.wiki.inline import Inline
+from lib.wiki.geometry import get_words, split_to_recursive_array
+from lib.wiki.inline import get_inline
+from lib.wiki.templates import register
 from lib.wiki.utils import count_words, one_line, trim
 
 
+class OutlineElement(NamedTuple):
+    """
+    One part in the outline; unpacks like the 5-tuple it replaces.
+    """
+
+    numbering: list
+    slug: str
+    title: str
+    title_slug: str
+    word_count: int
+
+
 class Outline(object):
     """
     Manage order of parts and table of contents, incl. word counts.
 
-    self.elements = [(numbering, slug, title, title_slug, word-count), ...]
+    self.elements = [OutlineElement(numbering, slug, title, title_slug,
+                                    word_count), ...]
 
     @todo: Track target totals; show completion of each area.
     """
@@ -38,7 +51,7 @@ class Outline(object):
             hierarchy = create_outline(parts)  # <-- counters? Hmmz.
 
         self.elements = [
-            (
+            OutlineElement(
                 numbering,
                 slug,
                 title,
@@ -50,10 +63,18 @@ class Outline(object):
         if "index" in parts:
             slug, title, title_slug, _ = get_title_data(parts["index"], "index")
             num_words = count_words(parts["index"])
-            element = (["0"], slug, title, title_slug, num_words)
+            element = OutlineElement(["0"], slug, title, title_slug, num_words)
             self.elements.insert(0, element)
 
+        # The first element wins, as in a scan.
+        self.by_slug = {}  # <-- {slug: element}
+        self.by_numbering = {}  # <-- {tuple(numbering): element}
+        for element in self.elements:
+            self.by_slug.setdefault(element.slug, element)
+            self.by_numbering.setdefault(tuple(element.numbering), element)
+
         self.errors = {}  # <-- store wiki errors in the outline
+        self.title_index = None  # <-- {term: {position, ...}}; see match_title()
 
     def __str__(self):
         """
@@ -95,28 +116,53 @@ class Outline(object):
         """
         Lookup outline tuple by numbering
         """
-        for numbering, _, title, _, _ in self.elements:
-            if match_numbering == numbering:
-                return title
-        return None
+        element = self.find_element(match_numbering)
+        return element.title if element else None
+
+    def find_element(self, match_numbering) -> Optional[OutlineElement]:
+        """
+        Return the element for a numbering (a list), or None.
+        """
+        if not isinstance(match_numbering, list):
+            return None
+        return self.by_numbering.get(tuple(match_numbering))
+
+    def match_title(self, terms: list) -> Optional[tuple]:
+        """
+        Return the first element whose title contains all of the terms (as
+        from get_words()), or None. The titles are indexed by term on the first
+        call, so each lookup is an intersection of the sets of positions for
+        each term.
+        """
+        if self.title_index is None:
+            self.title_index = {}
+            for position, (_, _, title, _, _) in enumerate(self.elements):
+                for term in get_words(title):
+                    self.title_index.setdefault(term, set()).add(position)
+        if not terms:
+            return self.elements[0] if self.elements else None
+        postings = []
+        for term in set(terms):
+            if term not in self.title_index:
+                return None
+            postings.append(self.title_index[term])
+        postings.sort(key=len)
+        positions = postings[0].intersection(*postings[1:])
+        return self.elements[min(positions)] if positions else None
 
     def find_slug(self, match_numbering, default=None):
         """
         Return the slug for a part, by numbering.
         """
-        for numbering, slug, _, _, _ in self.elements:
-            if numbering == match_numbering:
-                return slug
-        return default
+        element = self.find_element(match_numbering)
+        return element.slug if element else default
 
     def find_numbering(self, part_slug, default=None):
         """
         Return the numbering for a part, by slug.
         """
-        for numbering, slug, _, _, _ in self.elements:
-            if slug == part_slug:
-                return numbering
-        return default
+        element = self.by_slug.get(part_slug)
+        return element.numbering if element else default
 
     def total_word_count(self):
         """
@@ -140,75 +186,8 @@ class Outline(object):
         """
         Generate a table of contents.
         """
-        env = Environment(autoescape=True)
-        tpl = env.from_string(
-            trim(
-                """
-            {% if outline|length > 0 %}
-            <h2 id="table-of-contents">Table of Contents</h2>
-            <table class="table table-of-contents table-condensed">
-                <tbody>
-                    {% for numbering, name, slug, title, word_count, subtotal in outline %}
-                    <tr>
-                        {% if slug == 'index' %}
-                        <td></td>
-                        <td class="word-count" colspan="{{ (max_depth * 2) - 2 }}">
-                            <i>Word Count</i>
-                        </td>
-                        <td class="word-count">{{ word_count }}</td>
-                        <td class="word-count">\\\\&nbsp;<b>{{ total_word_count }}</b></td>
-                        {% else %}
-
-                            {% for i in range(numbering|length - 1) %}
-                        <td></td>
-                            {% endfor %}
-
-                        <td class="numbering">
-                            {{ numbering | join('.') }}.
-                        </td>
-
-                        {% if subtotal == "0" %}
-                        <td colspan="{{ (max_depth - numbering|length) * 2 + 1 }}">
-                        {% else %}
-                        <td colspan="{{ (max_depth - numbering|length) * 2 }}">
-                        {% endif %}
-
-                            {% if word_count == "0" %}
-                            <a href="{{ edit_base_uri }}/{{ slug }}?title={{ title|urlencode }}" class="unmarked">
-                                <i>{{ title|safe }}</i>
-                            </a>
-                            {% else %}
-                            <a href="#{{ name }}" class="unmarked">
-                                {{ title|safe }}
-                            </a>
-                            {% endif %}
-                        </td>
-
-                        <td class="word-count">
-                            {% if word_count == "0" %}&mdash;{% else %}{{ word_count }}{% endif %}
-                        </td>
-
-                            {% if numbering|length > 1 or subtotal != "0" %}
-                                {% if subtotal != "0" %}
-                        <td class="word-count">
-                            \\&nbsp;<b>{{ subtotal }}</b>
-                        </td>
-                                {% endif %}
-                                {% for i in range(numbering|length - 2) %}
-                        <td>
-                        </td>
-                                {% endfor %}
-                            {% endif %}
-                        {% endif %}
-                    </tr>
-                    {% endfor %}
-                </tbody>
-            </table>
-            {% endif %}
-            """
-            )
-        )
-        inline = Inline()
+        tpl = OUTLINE_TEMPLATE
+        inline = get_inline()
         max_depth = max([len(nums) for (nums, _, _, _, _) in self.elements])
         formatted = [
             (
@@ -234,28 +213,7 @@ class Outline(object):
         """
         Render an errors summary: @todo
         """
-        env = Environment(autoescape=True)
-        tpl = env.from_string(
-            trim(
-                """
-            <nav id="table-of-contents">
-                {% for number, name, title, word_count in outline %}
-                <div class="row">
-                    <div class="lg-col-9">
-                        {{ number }}.
-                        <a href="#{{ name }}">
-                            {{ title }}
-                        </a>
-                    </div>
-                    <div class="lg-col-3 text-right">
-                        {{ word_count }}
-                    </div>
-                </div>
-                {% endfor %}
-            </nav>
-            """
-            )
-        )
+        tpl = OUTLINE_ERRORS_TEMPLATE
         return tpl.render(errors=self.errors)
 
     def html_spare_parts(self, doc_parts, edit_base_uri):
@@ -272,22 +230,7 @@ class Outline(object):
             if _ not in found and _ not in ["index", "biblio"]
         ]
 
-        env = Environment(autoescape=True)
-        tpl = env.from_string(
-            trim(
-                """
-            {% if spare_parts|length > 0 %}
-            <div class="wiki-note">
-                These parts  do not appear in the index's outline:
-                    {% for slug in spare_parts %}
-                    • <a href="{{ edit_base_uri }}/{{ slug }}">{{ slug }}</a>
-                {% endfor %}
-                ({{ spare_parts|length }}).
-            </div>
-            {% endif %}
-            """
-            )
-        )
+        tpl = SPARE_PARTS_TEMPLATE
         return tpl.render(spare_parts=spare_parts, edit_base_uri=edit_base_uri)
 
 
@@ -387,23 +330,7 @@ def html_heading(numbering: list, title: str, slug: str, base_edit_uri: str) ->
 
     The numbering depth determines H1..H6.
     """
-    env = Environment(autoescape=True)
-    tpl = env.from_string(
-        trim(
-            """
-        <div class="pull-right">
-            <span>
-                <a href="{{ base_edit_uri }}{{ slug }}">Edit</a>
-            </span>
-        </div>
-        <{{ tag }} class="balance-text">
-            <a id="{{ name }}" href="#{{ name }}">
-                {{ title }}
-            </a>
-        </{{ tag }}>
-        """
-        )
-    )
+    tpl = HEADING_TEMPLATE
     return tpl.render(
         base_edit_uri=base_edit_uri,
         name=anchor_name(numbering, slug),
@@ -469,3 +396,138 @@ def totalize(elements: list) -> list:
             new_element += (0,)  # <-- To tuple
         new_elements.append(new_element)
     return list(reversed(new_elements))
+
+
+# ---------
+# Templates
+# ---------
+
+OUTLINE_TEMPLATE = register(
+    "outline",
+    trim(
+        """
+        {% if outline|length > 0 %}
+        <h2 id="table-of-contents">Table of Contents</h2>
+        <table class="table table-of-contents table-condensed">
+            <tbody>
+                {% for numbering, name, slug, title, word_count, subtotal in outline %}
+                <tr>
+                    {% if slug == 'index' %}
+                    <td></td>
+                    <td class="word-count" colspan="{{ (max_depth * 2) - 2 }}">
+                        <i>Word Count</i>
+                    </td>
+                    <td class="word-count">{{ word_count }}</td>
+                    <td class="word-count">\\\\&nbsp;<b>{{ total_word_count }}</b></td>
+                    {% else %}
+
+                        {% for i in range(numbering|length - 1) %}
+                    <td></td>
+                        {% endfor %}
+
+                    <td class="numbering">
+                        {{ numbering | join('.') }}.
+                    </td>
+
+                    {% if subtotal == "0" %}
+                    <td colspan="{{ (max_depth - numbering|length) * 2 + 1 }}">
+                    {% else %}
+                    <td colspan="{{ (max_depth - numbering|length) * 2 }}">
+                    {% endif %}
+
+                        {% if word_count == "0" %}
+                        <a href="{{ edit_base_uri }}/{{ slug }}?title={{ title|urlencode }}" class="unmarked">
+                            <i>{{ title|safe }}</i>
+                        </a>
+                        {% else %}
+                        <a href="#{{ name }}" class="unmarked">
+                            {{ title|safe }}
+                        </a>
+                        {% endif %}
+                    </td>
+
+                    <td class="word-count">
+                        {% if word_count == "0" %}&mdash;{% else %}{{ word_count }}{% endif %}
+                    </td>
+
+                        {% if numbering|length > 1 or subtotal != "0" %}
+                            {% if subtotal != "0" %}
+                    <td class="word-count">
+                        \\&nbsp;<b>{{ subtotal }}</b>
+                    </td>
+                            {% endif %}
+                            {% for i in range(numbering|length - 2) %}
+                    <td>
+                    </td>
+                            {% endfor %}
+                        {% endif %}
+                    {% endif %}
+                </tr>
+                {% endfor %}
+            </tbody>
+        </table>
+        {% endif %}
+        """
+    ),
+)
+
+
+OUTLINE_ERRORS_TEMPLATE = register(
+    "outline_errors",
+    trim(
+        """
+        <nav id="table-of-contents">
+            {% for number, name, title, word_count in outline %}
+            <div class="row">
+                <div class="lg-col-9">
+                    {{ number }}.
+                    <a href="#{{ name }}">
+                        {{ title }}
+                    </a>
+                </div>
+                <div class="lg-col-3 text-right">
+                    {{ word_count }}
+                </div>
+            </div>
+            {% endfor %}
+        </nav>
+        """
+    ),
+)
+
+
+SPARE_PARTS_TEMPLATE = register(
+    "spare_parts",
+    trim(
+        """
+        {% if spare_parts|length > 0 %}
+        <div class="wiki-note">
+            These parts  do not appear in the index's outline:
+                {% for slug in spare_parts %}
+                • <a href="{{ edit_base_uri }}/{{ slug }}">{{ slug }}</a>
+            {% endfor %}
+            ({{ spare_parts|length }}).
+        </div>
+        {% endif %}
+        """
+    ),
+)
+
+
+HEADING_TEMPLATE = register(
+    "heading",
+    trim(
+        """
+        <div class="pull-right">
+            <span>
+                <a href="{{ base_edit_uri }}{{ slug }}">Edit</a>
+            </span>
+        </div>
+        <{{ tag }} class="balance-text">
+            <a id="{{ name }}" href="#{{ name }}">
+                {{ title }}
+            </a>
+        </{{ tag }}>
+        """
+    ),
+)
@@ -92,22 +92,7 @@ class Placeholders(object):
         self.patterns = {}
 
         for slug, text in parts.items():
-            self.patterns[slug] = []
-            cursor, counter = 0, 1
-            new_text = ""
-
-            matches = self.pattern_regex.finditer(text)
-            for _ in matches:
-                self.patterns[slug] += [text[_.start() : _.end()]]
-                new_text += text[cursor : _.start()]
-                new_text += (
-                    self.delimiter + self.marker + ":" + str(counter) + self.delimiter
-                )
-                cursor = _.end()
-                counter += 1
-            new_text += text[cursor:]
-
-            new_parts[slug] = new_text
+            new_parts[slug], self.patterns[slug] = self.insert_text(text)
 
         assert isinstance(new_parts, dict)
         assert all([isinstance(_, str) for _ in new_parts])
@@ -116,6 +101,28 @@ class Placeholders(object):
 
         return new_parts
 
+    def insert_text(self, text):
+        """
+        Add placeholders to one text; return it with the list of patterns.
+        """
+        out, patterns, cursor = [], [], 0
+        for _ in self.pattern_regex.finditer(text):
+            patterns.append(_.group(0))
+            out.append(text[cursor : _.start()])
+            out.append(self.get_placeholder(len(patterns)))
+            cursor = _.end()
+        out.append(text[cursor:])
+        return "".join(out), patterns
+
+    def get_pattern(self, slug, number):
+        """
+        Return the nth pattern (counting from 1) matched in a part, or None.
+        """
+        patterns = self.patterns.get(slug, [])
+        if 0 < number <= len(patterns):
+            return patterns[number - 1]
+        return None
+
     def replace(self, decorator, html_parts):
         """
         Replace placeholders with decorated text. A decorator is a string ->
@@ -126,32 +133,32 @@ class Placeholders(object):
         Footnotes, the ordre of these will be more important again, with the in
         the wiki this means the index first, then others following the order of
         the index's outline.
+
+        Each placeholder is looked up by its number, so HTML that moves or
+        drops placeholders (e.g. footnotes) still gets the right pattern.
         """
         assert isinstance(decorator, collections.abc.Callable)
         assert isinstance(html_parts, dict)
         assert all([isinstance(_, str) for _ in html_parts])
-        # if len(self.patterns) != len(html_parts):
-        # print self.patterns.keys().sort()
-        # print html_parts.keys().sort()
 
         new_html_parts = {}
-
         for slug, text in html_parts.items():
-            matches = self.placeholder_regex.finditer(text)
-            cursor, number = 0, 0
-            new_html = ""
-            zipper = list(zip(self.patterns[slug], matches))
-            for pattern, match in zipper:
-                # assert int(match.group(1)) == number  # <-- Sanity
-                new_html += text[cursor : match.start()]
-                new_html += decorator(pattern, slug)  # <-- Numbers lookup
-                cursor = match.end()
-                number += 1
-            new_html += text[cursor:]
-            new_html_parts[slug] = new_html
-
+            new_html_parts[slug] = self.replace_text(decorator, slug, text)
         return new_html_parts
 
+    def replace_text(self, decorator, slug, text):
+        """
+        Replace placeholders in one part's text.
+        """
+
+        def decorate(match):
+            pattern = self.get_pattern(slug, int(match.group(1)))
+            if pattern is None:
+                return match.group(0)
+            return decorator(pattern, slug)
+
+        return self.placeholder_regex.sub(decorate, text)
+
 
 def is_placeholder(text):
     """
@@ -0,0 +1,122 @@
+"""
+Article Wiki: Render profiles.
+
+Wiki.process() records how long each of its stages takes, and how much work
+each did, in a RenderProfile. This costs a few perf_counter() calls per
+section, so it is always on.
+
+> wiki.process(user_slug, doc_slug, parts)
+> wiki.profile.timings  # <-- {"insert": 0.012, "outline": 0.002, ...}
+> wiki.profile.counts  # <-- {"sections": 40, "footnotes": 12, ...}
+> wiki.profile.server_timing()  # <-- 'insert;dur=12.0, outline;dur=2.0, ...'
+
+A RenderLog keeps the profiles of recent renders, to find the slowest.
+
+A streamed response sends its headers before most stages have run, so its
+Server-Timing header is partial; the complete profile is logged, and kept
+in the RenderLog, once the render finishes.
+"""
+
+import time
+
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import List
+
+STAGES = [
+    "insert",  # <-- Placeholders
+    "outline",  # <-- Outline and cross-references
+    "footnotes",  # <-- Footnotes and links
+    "bibliography",  # <-- Bibliography and citations
+    "blocks",  # <-- BlockList parsing and HTML
+    "replace",  # <-- Placeholders, and footnote HTML
+    "demo",  # <-- DEMO blocks rendered during "replace"
+]
+
+RENDER_LOG_SIZE = 1000  # <-- Renders kept per process
+
+
+class RenderProfile(object):
+    """
+    Timings (in seconds) and counts for the stages of one render.
+    """
+
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.started = time.perf_counter()
+        self.total = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Add the time spent in a `with` block to a stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def count(self, name: str, number: int = 1):
+        self.counts[name] += number
+
+    def finish(self):
+        """
+        Record the total time since the render started.
+        """
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """
+        Format as a Server-Timing header, in milliseconds.
+        """
+        metrics = [
+            "%s;dur=%.1f" % (name, self.timings[name] * 1000)
+            for name in STAGES
+            if name in self.timings
+        ]
+        if self.total is not None:
+            metrics.append("total;dur=%.1f" % (self.total * 1000))
+        return ", ".join(metrics)
+
+    def to_dict(self) -> dict:
+        return {
+            "total_ms": round((self.total or 0) * 1000, 1),
+            "timings_ms": {
+                name: round(self.timings[name] * 1000, 1)
+                for name in STAGES
+                if name in self.timings
+            },
+            "counts": dict(self.counts),
+        }
+
+
+class RenderLog(object):
+    """
+    The profiles of the most recent renders; appending is thread-safe.
+
+    > RENDER_LOG.add("user", "doc", wiki.profile)
+    > RENDER_LOG.slowest(20)
+    """
+
+    def __init__(self, maxlen: int = RENDER_LOG_SIZE):
+        self.entries = deque(maxlen=maxlen)
+
+    def add(self, user_slug: str, doc_slug: str, profile: RenderProfile):
+        if profile.total is not None:
+            entry = (profile.total, time.time(), user_slug, doc_slug, profile)
+            self.entries.append(entry)
+
+    def slowest(self, limit: int = 20) -> List[dict]:
+        """
+        Return the slowest recent renders, slowest first.
+        """
+        entries = sorted(list(self.entries), key=lambda _: _[0], reverse=True)
+        return [
+            {"user": user_slug, "doc": doc_slug, "time": timestamp, **profile.to_dict()}
+            for _, timestamp, user_slug, doc_slug, profile in entries[:limit]
+        ]
+
+
+RENDER_LOG = RenderLog()
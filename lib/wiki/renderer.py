@@ -6,7 +6,7 @@ repeating that everywhere, so we'll initialise once as a singleton.
 """
 
 import re
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
 
 from airium import Airium
 
@@ -15,7 +15,7 @@ from pprint import pformat
 
 from bleach import clean
 
-from lib.wiki.inline import Inline
+from lib.wiki.inline import get_inline
 from lib.wiki.utils import get_option, trim
 
 
@@ -29,7 +29,7 @@ class Html:
         Note that the _first_ one created will have its config used.
         """
         self.settings = settings
-        self.inline = Inline()
+        self.inline = get_inline()
         self.list_counter = 1
 
     def markup(self, text):
@@ -68,6 +68,109 @@ class Html:
         return html
 
 
+# ---------------------------
+# HTML writer
+# ---------------------------
+
+INDENT = "  "  # <-- Per level, as in Airium
+
+ATTRIBUTE_NAMES = {"klass": "class"}
+ATTRIBUTE_VALUES = {"True": "true", "False": "false", "None": "null"}
+
+
+def attributes(attrs: Dict) -> str:
+    """
+    Format tag attributes as Airium does (so id=None becomes id="null").
+    """
+    html = ""
+    for key, value in attrs.items():
+        value = str(value)
+        value = ATTRIBUTE_VALUES.get(value, value).replace('"', "&quot;")
+        html += ' %s="%s"' % (ATTRIBUTE_NAMES.get(key, key), value)
+    return html
+
+
+class HtmlWriter:
+    """
+    Append-only HTML builder for the scaffolding around sections; it lays out
+    tags exactly as Airium does (one line per tag or string, indented two
+    spaces per level) but keeps a flat list of lines and no tag objects.
+
+    > __ = HtmlWriter()
+    > with __.open("div", klass="section-group"):
+    >     __.tag("h1", "Title", klass="balance-text")
+    >     __(html)
+    > str(__)
+    """
+
+    __slots__ = ("chunks", "level", "closing", "drained")
+
+    def __init__(self):
+        self.chunks = []
+        self.level = 0
+        self.closing = []
+        self.drained = False
+
+    def __call__(self, html: Union[str, "HtmlWriter"]):
+        """
+        Append HTML; only its first line is indented.
+        """
+        if isinstance(html, HtmlWriter):
+            chunks = html.chunks
+            self.chunks.append(INDENT * self.level + (chunks[0] if chunks else ""))
+            self.chunks.extend(chunks[1:])
+        else:
+            self.chunks.append(INDENT * self.level + html)
+
+    def tag(self, name: str, text: str = "", **attrs):
+        """
+        Append an element on one line.
+        """
+        indent = INDENT * self.level
+        self.chunks.append(
+            "%s<%s%s>%s</%s>" % (indent, name, attributes(attrs), text, name)
+        )
+
+    def open(self, name: str, **attrs) -> "HtmlWriter":
+        """
+        Open an element, to be closed by the enclosing `with` (or close()).
+        """
+        self.chunks.append("%s<%s%s>" % (INDENT * self.level, name, attributes(attrs)))
+        self.closing.append(name)
+        self.level += 1
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """
+        Close the most recently opened element.
+        """
+        self.level -= 1
+        self.chunks.append("%s</%s>" % (INDENT * self.level, self.closing.pop()))
+
+    def drain(self) -> str:
+        """
+        Return the HTML written since the last drain, and forget it; for
+        streaming, the pieces join up to the same HTML as str() would be.
+        """
+        if not self.chunks:
+            return ""
+        html = "\n".join(self.chunks)
+        if self.drained:
+            html = "\n" + html
+        self.chunks = []
+        self.drained = True
+        return html
+
+    def __str__(self):
+        return "\n".join(self.chunks)
+
+
 # ---------------------------
 # Navigation elements
 # ---------------------------
@@ -94,29 +197,28 @@ def font_awesome(w: int, h: int, path: str) -> Airium:
 
 def side_button(
     name: str, _id=None, _klass=None, href=None, icon=None, label=None
-) -> Airium:
+) -> str:
     """
     Format the sidebar navigation buttons.
     """
-    __ = Airium()
-    button_id = _id
     button_icon = icon or name.lower()
     button_label = label or name
     button_class = "button-unit"
     if _klass:
         button_class += " " + _klass
+    __ = HtmlWriter()
     if href:
-        with __.a(klass=button_class, id=button_id, href=href):
-            __.i(klass="fa fa-fw fa-" + button_icon)
+        with __.open("a", klass=button_class, id=_id, href=href):
+            __.tag("i", klass="fa fa-fw fa-" + button_icon)
             __(button_label)
     else:
-        with __.button(klass=button_class, type="button"):
-            __.i(klass="fa fa-fw fa-" + button_icon)
+        with __.open("button", klass=button_class, type="button"):
+            __.tag("i", klass="fa fa-fw fa-" + button_icon)
             __(button_label)
-    return __
+    return str(__)
 
 
-def section_heading(nav_id, number, title_html, subtitle_html=None) -> Airium:
+def section_heading(nav_id, number, title_html, subtitle_html=None) -> str:
     """
     Format a section heading.
     """
@@ -124,17 +226,17 @@ def section_heading(nav_id, number, title_html, subtitle_html=None) -> Airium:
         hx = "h" + str(min(len(number.split(".")), 6))  # h1..h6
     else:
         hx = "h1"
-    __ = Airium()
-    with __.hgroup(klass="section-heading"):
-        with __.a(href="#" + nav_id):
-            with __.div(klass="headline"):
-                with __.div(klass="headline-number"):
-                    getattr(__, hx)(id=nav_id, _t="§" + (number or "A") + ".")
-                with __.div(klass="headline-title"):
-                    getattr(__, hx)(klass="balance-text", _t=title_html)
+    __ = HtmlWriter()
+    with __.open("hgroup", klass="section-heading"):
+        with __.open("a", href="#" + nav_id):
+            with __.open("div", klass="headline"):
+                with __.open("div", klass="headline-number"):
+                    __.tag(hx, "§" + (number or "A") + ".", id=nav_id)
+                with __.open("div", klass="headline-title"):
+                    __.tag(hx, title_html, klass="balance-text")
             if subtitle_html:
-                __.p(klass="summary balance-text", _t=subtitle_html)
-    return __
+                __.tag("p", subtitle_html, klass="summary balance-text")
+    return str(__)
 
 
 # ---------------------------
@@ -147,7 +249,7 @@ def alert(content, dump_vars=None):
     """
     Show a visual error notice.
     """
-    inline = Inline()
+    inline = get_inline()
     pattern = '<div class="alert alert-warning" role="alert">%s</div>'
     html = pattern % inline.process(content)
     if not dump_vars:
@@ -224,7 +326,7 @@ def get_cell_formatting(align, cell):
     """
     For table_block: align is one of lrc
     """
-    inline = Inline()
+    inline = get_inline()
     if align == "r":
         return ('class="text-right"', inline.process(cell))
     elif align == "c":
@@ -251,7 +353,7 @@ def tag(tag_name, text, class_name=""):
     """
     Regular tag+class convenience function
     """
-    inline = Inline()
+    inline = get_inline()
     if text == "":
         html = "&nbsp;"
     else:
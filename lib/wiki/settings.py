@@ -14,6 +14,7 @@ from html import escape
 from copy import deepcopy
 
 from lib.wiki.blocks import BlockList
+from lib.wiki.cache import content_key
 from lib.wiki.geometry import split_to_dictionary
 
 
@@ -81,6 +82,18 @@ class Settings(object):
         """
         return self._.get(key, default)
 
+    def snapshot(self):
+        """
+        Return a copy of the current values, e.g. to restore with update().
+        """
+        return dict(self._)
+
+    def fingerprint(self):
+        """
+        A short hash of all current values, for use in cache keys.
+        """
+        return content_key(sorted(self._.items()))
+
     def format_value(self, pattern):
         """
         Replace a $[pattern] marker with self._[pattern], if exists.
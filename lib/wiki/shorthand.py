@@ -1,5 +1,7 @@
 import re
 
+from functools import partial
+
 from lib.wiki.config import Config
 
 
@@ -33,28 +35,26 @@ class Shorthand(object):
         lib in pip that doesn't have this limitation, but doesn't look as
         stable.
 
-        The adopted solution is a set of three regexes that together handle
-        the start and end of strings, plus the lookahead and lookbehind thatn
-        prevents mismatching in the middle of strings.
-
-        @todo: Consider a simpler solution using a single match for all four
-        shorthand characters, and a \1 for back-matching.
+        The adopted solution is a pair of regexes that together handle the
+        start and end of strings, plus the lookahead and lookbehind that
+        prevents mismatching in the middle of strings. Replacement templates
+        are compiled along with the patterns.
         """
         delimiter = re.escape(symbol)
         regex_parts = [
-            [r"^", r"([^%s]+)" % delimiter, r"(?=[\W])"],
-            [r"(?<=[\s\(\[])", r"([^%s]+)" % delimiter, r"(?=[\W])"],
-            [r"(?<=[\s\(\[])", r"([^%s]+)" % delimiter, r"$"],
-            [r"^", r"([^%s]+)" % delimiter, r"$"],
+            [r"(?:^|(?<=[\s\(\[]))", r"([^%s]+)" % delimiter, r"(?=[\W])"],
+            [r"(?:^|(?<=[\s\(\[]))", r"([^%s]+)" % delimiter, r"$"],
         ]
+        template = r"<%s>\1</%s>" % (tag, tag)
         for lookbehind, match, lookahead in regex_parts:
             pattern = lookbehind + delimiter + match + delimiter + lookahead
-            self.regexes.append([re.compile(pattern), tag])
+            regex = re.compile(pattern)
+            self.regexes.append([regex, partial(regex.sub, template)])
 
     def replace(self, text):
         """
-        Inefficient multi-pass regexes; but hey...
+        Two passes per symbol, in the order given.
         """
-        for regex, tag in self.regexes:
-            text = re.sub(regex, r"<%s>\1</%s>" % (tag, tag), text)
+        for regex, substitute in self.regexes:
+            text = substitute(text)
         return text
@@ -0,0 +1,41 @@
+"""
+Article Wiki: Template registry.
+
+The HTML fragments of a document (table of contents, headings, footnotes,
+bibliography, index, grids, glosses) are small Jinja templates. Each one is
+compiled once, when its module is imported, and shared; compiled templates
+are safe to render from many threads at once.
+
+> OUTLINE_TEMPLATE = register("outline", source)
+> html = OUTLINE_TEMPLATE.render(outline=outline)
+"""
+
+from typing import Dict
+
+from jinja2 import Environment, Template
+
+ENVIRONMENT = Environment(autoescape=True)
+
+TEMPLATES: Dict[str, Template] = {}
+SOURCES: Dict[str, str] = {}  # <-- For benchmarks
+
+
+def register(name: str, source: str) -> Template:
+    """
+    Compile a template and store it by name. Registering the same source
+    again (e.g. when a module is reloaded) returns the stored template.
+    """
+    if name in TEMPLATES:
+        if SOURCES[name] == source:
+            return TEMPLATES[name]
+        raise ValueError("Template already registered: %s" % name)
+    SOURCES[name] = source
+    TEMPLATES[name] = ENVIRONMENT.from_string(source)
+    return TEMPLATES[name]
+
+
+def get_template(name: str) -> Template:
+    """
+    Look up a compiled template by name.
+    """
+    return TEMPLATES[name]
@@ -0,0 +1,32 @@
+from .context import lib  # noqa: F401
+
+from lib.wiki.bible_references import (
+    REFERENCES_CACHE,
+    BibleReferences,
+    find_references,
+    get_refspy,
+)
+from lib.wiki.outline import Outline, default_counters
+
+
+def test_get_refspy():
+    assert get_refspy() is get_refspy()
+
+
+def test_find_references():
+    REFERENCES_CACHE.clear()
+    text = "See Rom 3:23 and 1 Cor 13:1-4."
+    matches = find_references(text)
+    assert [match_str for match_str, _ in matches] == ["Rom 3:23", "1 Cor 13:1-4"]
+    assert find_references(text) == matches
+    assert REFERENCES_CACHE.hits == 1
+    assert REFERENCES_CACHE.misses == 1
+
+
+def test_insert():
+    parts = {"index": "Title\n\n- Part", "part": "Part\n\nSee Rom 3:23."}
+    outline = Outline(parts, default_counters())
+    bible_references = BibleReferences(outline)
+    safe_parts = bible_references.insert(parts)
+    assert safe_parts["part"] == "Part\n\nSee ⚡ref0⚡."
+    assert bible_references.refspy is get_refspy()
@@ -4,6 +4,7 @@ from lxml import html
 
 from lib.wiki.bibliography import (
     Bibliography,
+    citation_terms,
     create_unique_labels,
     get_sentences,
     nonempty_lines,
@@ -92,6 +93,15 @@ def test_match():
     bibliography = Bibliography(parts, outline, id_prefix)
     assert bibliography.match("author") == "Author. 1999."
     assert bibliography.match("author 2000") == "Author. 2000a."
+    assert bibliography.match("auth 99") == "Author. 1999."  # <-- Substrings
+    assert bibliography.match("/Author/ 2000") == "Author. 2000a."  # <-- Markup
+    assert bibliography.match("other", "Default") == "Default"
+    assert bibliography.match("") == "Author. 1999."
+
+
+def test_citation_terms():
+    assert citation_terms("Author 2000, Title") == ("author", "2000", "title")
+    assert citation_terms("/Author/ 2x3") == ("author", "2", "times", "3")
 
 
 def test_get_count():
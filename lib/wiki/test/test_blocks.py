@@ -8,6 +8,7 @@ from lxml import html
 from .context import lib  # noqa: F401
 
 from lib.wiki.blocks import (
+    BLOCK_CACHE,
     BlockList,
     CharacterBlock,
     Divider,
@@ -444,3 +445,28 @@ def test_table_block():
     )
     actual = table_block(text, Settings())
     assert expect == actual
+
+
+def test_block_cache():
+    BLOCK_CACHE.clear()
+    blocks = BlockList(
+        trim(
+            """
+            A *[paragraph].
+
+            > A quote.
+
+            # Numbered
+
+            A $[NUMBERING] value.
+            """
+        )
+    )
+    first = blocks.html(["1"], "slug", Settings({"NUMBERING": "3"}), fragment=True)
+    assert len(BLOCK_CACHE) == 2  # <-- Not lists or $[...]
+    second = blocks.html(["1"], "slug", Settings({"NUMBERING": "3"}), fragment=True)
+    assert first == second
+    assert BLOCK_CACHE.hits == 2
+    assert Paragraph("A $[X].").memo_key() is None
+    assert CharacterBlock("$ X = 1").memo_key() is None
+    assert FunctionBlock(Text, [], "-", "x").memo_key() is not None
@@ -0,0 +1,22 @@
+from .context import lib  # noqa: F401
+
+from lib.wiki.cache import RenderCache, content_key
+
+
+def test_render_cache():
+    cache = RenderCache(maxsize=10, getsizeof=len)
+    cache.set("a", "12345")
+    assert cache.get("a") == "12345"
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.set("c", "x" * 20)  # <-- Too large; skipped
+    assert "c" not in cache
+    cache.set("d", "123456")  # <-- Evicts 'a'
+    assert "a" not in cache
+    cache.enabled = False
+    assert cache.get("d") is None
+
+
+def test_content_key():
+    assert content_key("a", ["1"], True) == content_key("a", ["1"], True)
+    assert content_key("a", ["1"], True) != content_key("a", ["1"], False)
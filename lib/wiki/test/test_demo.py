@@ -7,7 +7,7 @@ from .context import lib  # noqa: F401
 
 from lib.wiki.placeholders import DELIMITER
 from lib.wiki.settings import Settings
-from lib.wiki.wiki import Demo
+from lib.wiki.wiki import DEMO_CACHE, Demo
 from lib.wiki.utils import trim
 
 
@@ -72,3 +72,37 @@ def test_basic_replacements():
     __ = html.fromstring(decorated["test"])
     assert __.xpath("count(//div[@class='wiki-demo'])") == 2
     assert __.xpath("//pre[contains(., Test)]")
+
+
+def test_cached_demos():
+    """
+    Repeated DEMO blocks get their own ids; output is reused across renders.
+    """
+    DEMO_CACHE.clear()
+    parts = {
+        "test": trim(
+            """
+        DEMO ===
+        Footnote.^
+
+        ^ Note.
+        ===
+
+        DEMO ===
+        Footnote.^
+
+        ^ Note.
+        ===
+        """
+        )
+    }
+    first = Demo()
+    decorated = first.replace(first.insert(parts))["test"]
+    assert first.profile.counts["demos"] == 2
+    __ = html.fromstring(decorated)
+    ids = __.xpath("//section/@id")
+    assert len(set(ids)) == 2
+
+    second = Demo()
+    assert second.replace(second.insert(parts))["test"] == decorated
+    assert second.profile.counts["cached_demos"] == 2
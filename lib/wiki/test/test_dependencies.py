@@ -0,0 +1,74 @@
+from .context import lib  # noqa: F401
+
+from lib.wiki.dependencies import Dependencies
+from lib.wiki.settings import Settings
+from lib.wiki.utils import trim
+from lib.wiki.wiki import Wiki
+
+
+def test_dependencies():
+    dependencies = Dependencies()
+    dependencies.source("a", ["1"], "A", "")
+    dependencies.source("b", ["2"], "B", "")
+    dependencies.add("a", "section", "@[B]", (["2"], "b", "B"))
+    assert dependencies.targets("a") == [("section", "@[B]")]
+    assert dependencies.dependents("section", "@[B]") == ["a"]
+
+    previous = dependencies.fingerprints()
+    assert dependencies.changed(previous) == set()
+
+    dependencies.add("a", "section", "@[B]", (["3"], "b", "B"))
+    assert dependencies.changed(previous) == {"a"}
+    assert dependencies.changed({}) == {"a", "b"}
+
+
+def process(document):
+    wiki = Wiki(Settings({"config:document": "doc-slug"}))  # <-- Fixed ids
+    wiki.process("user-slug", "doc-slug", document)
+    return wiki.dependencies
+
+
+def test_wiki_dependencies():
+    document = {
+        "index": trim(
+            """
+            Document
+
+            - Part One
+            - Part Two
+            - Part Three
+            """
+        ),
+        "part-one": "Part One\n\nSee @[Part Two] and ~[Calvin].",
+        "part-two": "Part Two\n\nText.",
+        "part-three": "Part Three\n\nText.",
+        "biblio": "Calvin, John. 1559. /Institutes/.",
+    }
+    dependencies = process(document)
+    assert ("section", "@[Part Two]") in dependencies.targets("part-one")
+    assert ("citation", "Calvin") in dependencies.targets("part-one")
+    assert dependencies.dependents("section", "@[Part Two]") == ["part-one"]
+    previous = dependencies.fingerprints()
+
+    assert process(document).changed(previous) == set()
+
+    # Editing a part changes the index (word counts) but not the parts that
+    # refer to it.
+    document["part-two"] = "Part Two\n\nMore text."
+    assert process(document).changed(previous) == {"index", "part-two"}
+
+    # Reordering parts changes their numbering, and so cross-references.
+    document["index"] = document["index"].replace(
+        "- Part Two\n- Part Three", "- Part Three\n- Part Two"
+    )
+    assert process(document).changed(previous) == {
+        "index",
+        "part-one",
+        "part-two",
+        "part-three",
+    }
+
+    # The bibliography is fingerprinted by its output.
+    previous = process(document).fingerprints()
+    document["biblio"] += "\nLuther, Martin. 1520. /Freedom/."
+    assert process(document).changed(previous) == {"biblio"}
@@ -4,7 +4,7 @@ Inline handles all inline markup. It is applied within Blocks.
 
 from .context import lib  # noqa: F401
 
-from lib.wiki.inline import Inline, space_sentences
+from lib.wiki.inline import Inline, get_inline, process_memo, space_sentences
 
 
 def test_brackets():
@@ -74,3 +74,24 @@ def test_dashes():
     assert "&ndash;x&ndash;y&ndash;" == test.process("--x--y--")
     assert "&mdash;x&mdash;y&mdash;" == test.process("--- x --- y ---")
     assert "&mdash;x&mdash;y&mdash;" == test.process("---x---y---")
+
+
+def test_symbols():
+    test = Inline()
+    assert "&#8239;&#8239; &#8239;&#8239;&#8239;&#8239; &#8239;" == test.typography(
+        "(2S) (4S) (S)"
+    )
+    assert "𝔓 𝔐 &reg; &deg; (X) ⬛" == test.typography("(PPY) (MSS) (R) (D) (X) (END)")
+    assert "&hellip;." == test.typography("....")
+
+
+def test_shared_instance():
+    assert get_inline() is get_inline()
+    assert Inline().shorthand is get_inline().shorthand
+    process_memo.cache_clear()
+    assert "<strong>A</strong> Title" == get_inline().process("*[A] Title")
+    assert "<strong>A</strong> Title" == Inline().process("*[A] Title")
+    assert process_memo.cache_info().hits == 1
+    long_text = "*[A] Title " * 50
+    assert get_inline().process(long_text) == get_inline().process_text(long_text)
+    assert process_memo.cache_info().currsize == 1
@@ -121,6 +121,33 @@ def test_find_numbering():
     assert outline.find_numbering("chapter-one") == ["1"]
     assert outline.find_numbering("chapter-one-aye") == ["1", "a"]
     assert outline.find_numbering("chapter-two") == ["2"]
+    assert outline.find_numbering("missing", "default") == "default"
+    assert outline.find_slug(["1", "a"]) == "chapter-one-aye"
+    assert outline.find_slug(["3"], "default") == "default"
+    assert outline.find_title(["2"]) == "Chapter Two"
+    assert outline.find_title(("2",)) is None  # <-- Lists only, as before
+    assert outline.find_element(["0"]).word_count == 8
+
+
+def test_match_title():
+    arg = {
+        "index": trim(
+            """
+            Title
+
+            - Chapter One
+            - - Chapter One Aye
+            - Chapter Two
+            """
+        ),
+    }
+    outline = Outline(arg, default_counters())
+    assert outline.match_title(["chapter"])[1] == "chapter-one"  # <-- First
+    assert outline.match_title(["aye", "one"])[1] == "chapter-one-aye"
+    assert outline.match_title(["two", "chapter"])[1] == "chapter-two"
+    assert outline.match_title(["three"]) is None
+    assert outline.match_title(["aye", "two"]) is None
+    assert outline.match_title([])[1] == "index"
 
 
 def test_elements():
@@ -52,3 +52,14 @@ def test_is_placeholder():
     text = " %s\n" % placeholder.get_placeholder(1)
     assert is_placeholder(text)
     assert not is_placeholder("! " + text)
+
+
+def test_replace_by_number():
+    """
+    Placeholders may be moved or dropped in the HTML (e.g. footnotes).
+    """
+    placeholders = Placeholders(r"\d", "n", "|")
+    tokenized = placeholders.insert({"test": "1 2 3"})
+    assert {"test": "|n:1| |n:2| |n:3|"} == tokenized
+    decorated = placeholders.replace(lambda x, _: x, {"test": "|n:3| |n:1|"})
+    assert {"test": "3 1"} == decorated
@@ -0,0 +1,54 @@
+from .context import lib  # noqa: F401
+
+from lib.wiki.profile import RenderLog, RenderProfile
+from lib.wiki.settings import Settings
+from lib.wiki.utils import trim
+from lib.wiki.wiki import DEMO_CACHE, SECTION_CACHE, Wiki
+
+
+def test_render_profile():
+    DEMO_CACHE.clear()  # <-- Else the section and demo may not be rendered
+    SECTION_CACHE.clear()
+    document = {
+        "index": trim(
+            """
+            Document
+
+            - Part One
+            """
+        ),
+        "part-one": trim(
+            """
+            Part One
+
+            See @[Part One].^[Note]
+
+            ^ Footnote.
+
+            DEMO ---
+            Demo
+            ---
+            """
+        ),
+    }
+    wiki = Wiki(Settings())
+    wiki.process("user-slug", "doc-slug", document)
+    profile = wiki.profile
+    assert profile.total > 0
+    for stage in ["insert", "outline", "footnotes", "blocks", "replace", "demo"]:
+        assert stage in profile.timings
+    assert profile.counts["parts"] == 2
+    assert profile.counts["footnotes"] == 1
+    assert profile.counts["demos"] == 1
+    assert profile.server_timing().startswith("insert;dur=")
+    assert profile.server_timing().endswith("total;dur=%.1f" % (profile.total * 1000))
+
+
+def test_render_log():
+    log = RenderLog(maxlen=2)
+    for total in [3.0, 1.0, 2.0]:
+        profile = RenderProfile()
+        profile.total = total
+        log.add("user-slug", "doc-%d" % total, profile)
+    assert [_["doc"] for _ in log.slowest()] == ["doc-2", "doc-1"]  # <-- 3 expired
+    assert log.slowest(1)[0]["total_ms"] == 2000.0
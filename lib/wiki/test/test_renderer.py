@@ -0,0 +1,36 @@
+from airium import Airium
+
+from .context import lib  # noqa: F401
+
+from lib.wiki.renderer import HtmlWriter, side_button
+
+
+def test_html_writer_matches_airium():
+    expected = Airium()
+    with expected.article():
+        expected(Airium())
+        with expected.div(klass="section-group", id=None):
+            expected.div(klass="left-margin")
+            expected("<p>First</p>\n<p>Second</p>")
+            with expected.div(klass="right-margin"):
+                pass
+        expected.h1(klass="balance-text", _t="Title")
+    __ = HtmlWriter()
+    with __.open("article"):
+        __(HtmlWriter())
+        with __.open("div", klass="section-group", id=None):
+            __.tag("div", klass="left-margin")
+            __("<p>First</p>\n<p>Second</p>")
+            with __.open("div", klass="right-margin"):
+                pass
+        __.tag("h1", "Title", klass="balance-text")
+    assert str(__) == str(expected)
+
+
+def test_side_button():
+    assert side_button(name="Home", icon="home", href="/") == (
+        '<a class="button-unit" id="null" href="/">\n'
+        '  <i class="fa fa-fw fa-home"></i>\n'
+        "  Home\n"
+        "</a>"
+    )
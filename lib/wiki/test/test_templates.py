@@ -0,0 +1,16 @@
+import pytest
+
+from .context import lib  # noqa: F401
+
+from lib.wiki.outline import OUTLINE_TEMPLATE
+from lib.wiki.templates import get_template, register
+
+
+def test_register():
+    assert get_template("outline") is OUTLINE_TEMPLATE
+    template = register("test_register", "<b>{{ text }}</b>")
+    assert get_template("test_register") is template
+    assert template.render(text="<i>") == "<b>&lt;i&gt;</b>"
+    assert register("test_register", "<b>{{ text }}</b>") is template
+    with pytest.raises(ValueError):
+        register("test_register", "")
@@ -4,7 +4,14 @@ from .context import lib  # noqa: F401
 
 from lib.wiki.settings import Settings
 from lib.wiki.utils import trim
-from lib.wiki.wiki import Wiki, clean_document, clean_text, is_index_part, reformat_part
+from lib.wiki.wiki import (
+    SECTION_CACHE,
+    Wiki,
+    clean_document,
+    clean_text,
+    is_index_part,
+    reformat_part,
+)
 
 
 def test_clean_document():
@@ -110,3 +117,54 @@ def test_reformat_part():
         """
     )
     assert part == reformat_part("random", clean_text(part))
+
+
+def test_section_cache():
+    SECTION_CACHE.clear()
+    document = {
+        "index": trim(
+            """
+            Document
+
+            $ COUNTER = 10
+
+            - Part One
+            - Part Two
+            """
+        ),
+        "part-one": "Part One\n\nCounted $[COUNTER++], see @[Part Two].",
+        "part-two": "Part Two\n\nCounted $[COUNTER++].",
+    }
+    first = Wiki(Settings()).process("user-slug", "doc-slug", document)
+    assert SECTION_CACHE.hits == 0
+    second = Wiki(Settings()).process("user-slug", "doc-slug", document)
+    assert SECTION_CACHE.hits == 2
+    assert first == second
+    assert "Counted 12." in second  # <-- Settings changes are replayed
+
+    document["part-two"] = "Part Two\n\nChanged $[COUNTER++]."
+    _ = Wiki(Settings()).process("user-slug", "doc-slug", document)
+    assert SECTION_CACHE.hits == 3
+    assert "Changed 12." in _
+
+
+def test_stream():
+    document = {
+        "index": trim(
+            """
+            Document
+
+            - Part One
+            - Part Two
+            """
+        ),
+        "part-one": "Part One\n\nSee @[Part Two].^[Note]\n\n^ Footnote text.",
+        "part-two": "Part Two\n\nSee @[Part One].",
+    }
+    settings = {"config:user": "user-slug", "config:document": "doc-slug"}
+    expect = Wiki(Settings(settings)).process("user-slug", "doc-slug", document)
+    pieces = list(Wiki(Settings(settings)).stream("user-slug", "doc-slug", document))
+    assert len(pieces) == 6  # <-- header, index, two sections, biblio, footers
+    assert pieces[0].startswith("<article>")
+    assert "Footnote text." in pieces[2]
+    assert "".join(pieces) == expect
@@ -80,16 +80,10 @@ def count_words(text):
 
 def html_escape(text):
     """
-    Produce entities within text.
-    """
-    html_escape_table = {
-        ">": "&gt;",
-        "<": "&lt;",
-        # "'": "&apos;",
-        # '"': "&quot;",
-        "&": "&amp;",
-    }
-    return "".join(html_escape_table.get(c, c) for c in text)
+    Produce entities within text; quotes are left for typography. (The
+    ampersand must go first.)
+    """
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
 
 
 def get_option(options, index, of_type="all", default=""):
@@ -12,24 +12,26 @@ from datetime import date, datetime
 from html import escape
 from pprint import pformat
 
-from airium import Airium
 from dateutil.parser import parse
 
 from lib.slugs import slug
 from lib.wiki.backslashes import Backslashes
 from lib.wiki.bibliography import Bibliography, split_bibliography
 from lib.wiki.blocks import BlockList, get_title_data
+from lib.wiki.cache import RenderCache, content_key
 from lib.wiki.citations import Citations
 from lib.wiki.config import Config
 from lib.wiki.cross_references import CrossReferences
+from lib.wiki.dependencies import Dependencies
 from lib.wiki.entities import Entities
 from lib.wiki.footnotes import Footnotes
-from lib.wiki.inline import Inline
+from lib.wiki.inline import get_inline
 from lib.wiki.links import Links
 from lib.wiki.outline import Outline, default_counters
 from lib.wiki.placeholders import Placeholders
+from lib.wiki.profile import RenderProfile
 from lib.wiki.bible_references import BibleReferences
-from lib.wiki.renderer import Html, section_heading, side_button
+from lib.wiki.renderer import INDENT, Html, HtmlWriter, section_heading, side_button
 from lib.wiki.settings import Settings
 from lib.wiki.utils import (
     DATE_FORMAT_ISO8601,
@@ -43,6 +45,19 @@ from lib.wiki.utils import (
 )
 from lib.wiki.verbatim import Verbatim
 
+# Rendered sections, keyed by everything that went into them; the size is
+# measured in characters of HTML.
+SECTION_CACHE = RenderCache(maxsize=20_000_000, getsizeof=lambda _: len(_[0]))
+
+# Rendered DEMO blocks, keyed by source, options, position and settings.
+DEMO_CACHE = RenderCache(maxsize=5_000_000, getsizeof=lambda _: len(_[0]))
+
+# Navigation buttons that are the same in every document.
+HOME_BUTTON = side_button(name="Home", icon="home", href="/")
+MENU_BUTTON = side_button(name="Menu", icon="bars", _klass="navigation-button")
+THEME_BUTTON = side_button(name="Dark", icon="adjust", _klass="theme-button")
+FULLSCREEN_BUTTON = side_button(name="Full", icon="expand", _klass="fullscreen-button")
+
 
 class Wiki(object):
     """
@@ -73,6 +88,9 @@ class Wiki(object):
         self.tags = None
         self.bibliography = None
         self.citations = None
+        self.dependencies = None
+        self.sources = {}
+        self.profile = RenderProfile()
 
     def process(self, user_slug, doc_slug, parts_dict, fragment=False, preview=False):
         """
@@ -89,66 +107,102 @@ class Wiki(object):
         if len(parts_dict) == 0:
             return ValueError("Document is empty.")
 
+        return "".join(self.stream(user_slug, doc_slug, parts_dict, fragment, preview))
+
+    def stream(self, user_slug, doc_slug, parts_dict, fragment=False, preview=False):
+        """
+        Generate the same HTML as process(), in pieces: the header (title
+        card) first, then the index and each section as it is finished, then
+        the footers. Each section is rendered and has its placeholders
+        replaced in turn, so a response can start long before the last
+        section is done.
+
+        Stage timings and counts are recorded in self.profile.
+        """
+        self.profile = profile = RenderProfile()
         validate_document(parts_dict, fragment)
         parts, files = clean_document(parts_dict)
+        self.sources = parts  # <-- Before placeholders, for cache keys
+        profile.count("parts", len(parts))
 
         # ------------------------------------------------------
         # Add placeholders for elements not processed by the wiki
         # -------------------------------------------------------
 
-        self.demo = Demo()
+        self.demo = Demo(profile=profile)
         self.backslashes = Backslashes()
         self.entities = Entities()
         self.verbatim = Verbatim()
 
         # Demo is first:
-        parts = pipe(
-            [
-                self.entities,
-                self.backslashes,
-                self.verbatim,
-                self.demo,
-            ],
-            "insert",
-            parts,
-        )
+        with profile.stage("insert"):
+            parts = pipe(
+                [
+                    self.entities,
+                    self.backslashes,
+                    self.verbatim,
+                    self.demo,
+                ],
+                "insert",
+                parts,
+            )
 
         self.settings.extract(parts)
 
         # @todo:decide on file support.
         self.settings.set_config("files", files)
 
+        # What each section refers to in other parts
+        self.dependencies = Dependencies()
+
         # @[Cross Reference]
-        self.outline = Outline(parts, default_counters())
-        self.cross_references = CrossReferences(parts, self.outline)
+        with profile.stage("outline"):
+            self.outline = Outline(parts, default_counters())
+            self.cross_references = CrossReferences(
+                parts, self.outline, self.dependencies
+            )
 
         # No syntax, detected with refspy; How to have plugins modify the outline?
         self.bible_references = BibleReferences(self.outline)
 
         # ^[marker]
         # ^ Reference
-        self.footnotes = Footnotes(parts, self.outline, self.id_prefix)
-        self.links = Links(self.footnotes, self.id_prefix)
+        with profile.stage("footnotes"):
+            self.footnotes = Footnotes(parts, self.outline, self.id_prefix)
+            self.links = Links(self.footnotes, self.id_prefix)
 
         # #[Topic, sub-topic]
         # self.index = Index(self.outline)
         # self.tags = Tags(self.index)
 
         # ~[Author 2000, p.34]
-        self.bibliography = Bibliography(parts, self.outline, self.id_prefix)
-        self.citations = Citations(self.bibliography)
-
-        parts = pipe(
-            [
-                self.cross_references,  # <-- call 'insert(parts)'
-                self.bible_references,
-                self.links,
-                # self.tags,
-                self.citations,
-            ],
-            "insert",
-            parts,
-        )
+        with profile.stage("bibliography"):
+            self.bibliography = Bibliography(parts, self.outline, self.id_prefix)
+            self.citations = Citations(self.bibliography, self.dependencies)
+
+        with profile.stage("insert"):
+            parts = pipe(
+                [
+                    self.cross_references,  # <-- call 'insert(parts)'
+                    self.bible_references,
+                    self.links,
+                    # self.tags,
+                    self.citations,
+                ],
+                "insert",
+                parts,
+            )
+        placeholders = [
+            self.demo,
+            self.backslashes,
+            self.entities,
+            self.verbatim,
+            self.cross_references,
+            self.bible_references,
+            self.links,
+        ]
+        profile.count("placeholders", sum(len(_.placeholders) for _ in placeholders))
+        profile.count("citations", len(self.citations.placeholders))
 
         # Plugins should involve footnotes and bibliographies, as well as
         # figures in future; these should add sections that appear in the
@@ -159,117 +213,118 @@ class Wiki(object):
         # Generate HTML
         # -------------
 
-        html_parts = {}
-
         if "index" in parts:
             _, title, _, summary = get_title_data(parts["index"], "index")
             self.settings.set("TITLE", title)
             self.settings.set("SUMMARY", summary)
-            html_parts["index"] = self.make_index(parts)
         else:
             self.settings.set("TITLE", "")
 
-        for numbering, _slug, _, _, _ in self.outline:
-            if _slug in parts and _slug not in ["index", "biblio"]:
-                section = self.make_section(
-                    numbering, _slug, parts[_slug], fragment, preview
-                )
-                html_parts[_slug] = section
-
-        # -------------------------------------
-        # Replace placeholder content (as HTML)
-        # -------------------------------------
-
-        html_parts = pipe(
-            [self.cross_references, self.bible_references, self.links, self.citations],
-            "replace",
-            html_parts,
-        )
-
-        html_parts = pipe(
-            [self.demo, self.verbatim, self.backslashes, self.entities],
-            "replace",
-            html_parts,
-        )
+        __ = HtmlWriter()
+        __.open("article")
+        if not fragment:
+            __(self.make_header(fragment, preview))
+        yield __.drain()
+
+        # The sections are spliced into the article: as with __(), only
+        # their first line takes the article's indentation.
+        sections = HtmlWriter()
+        for _ in self.make_sections(sections, parts, fragment, preview):
+            if sections.drained:
+                yield sections.drain()
+            else:
+                yield "\n" + INDENT + sections.drain()
+
+        if not fragment and not preview:
+            for plugin in self.plugins:
+                __(self.make_plugin_footer(plugin))
+        __.close()
+        profile.count("footnotes", sum(map(len, self.footnotes.backlinks.values())))
+        profile.finish()
+        yield __.drain()
+
+    def replace_placeholders(self, slug, html):
+        """
+        Replace placeholder content (as HTML) in a rendered part.
+        """
+        with self.profile.stage("replace"):
+            html_parts = pipe(
+                [
+                    self.cross_references,
+                    self.bible_references,
+                    self.links,
+                    self.citations,
+                ],
+                "replace",
+                {slug: html},
+            )
+            html_parts = pipe(
+                [self.demo, self.verbatim, self.backslashes, self.entities],
+                "replace",
+                html_parts,
+            )
+        return html_parts[slug]
+
+    def finish_section(self, numbering, slug, text, fragment, preview):
+        """
+        Render a section, replace its placeholders, and add its footnotes.
+        """
+        html = self.make_section(numbering, slug, text, fragment, preview)
+        html = self.replace_placeholders(slug, html)
 
-        # Add footnote HTML to each part
-        footnote_parts = self.footnotes.html_parts()
         pipeline = [self.verbatim, self.backslashes, self.entities]
-        footnote_html = pipe(pipeline, "replace", footnote_parts)
-
-        for numbering, _slug, _, _, _ in self.outline:
-            footnotes = footnote_html.get(_slug)
+        with self.profile.stage("replace"):
+            footnotes = self.footnotes.html_part(".".join(numbering))
             if footnotes:
-                __ = Airium()
-                with __.footer(klass="footnotes"):
-                    __(footnotes)
-                html_parts[_slug] += str(__)
-
-        __ = Airium()
-        with __.article():
-            if not fragment:
-                __(self.make_header(fragment, preview))
-            __(self.make_sections(html_parts, fragment, preview))
-            if not fragment and not preview:
-                for plugin in self.plugins:
-                    __(self.make_plugin_footer(plugin))
-        return str(__)
-
-    def make_header(self, fragment, preview) -> Airium:
+                footnotes = pipe(pipeline, "replace", {slug: footnotes})
+                __ = HtmlWriter()
+                with __.open("footer", klass="footnotes"):
+                    __(footnotes[slug])
+                html += str(__)
+        self.profile.count("sections")
+        return html
+
+    def make_header(self, fragment, preview) -> HtmlWriter:
         """
         Create front matter with margins.
         """
-        __ = Airium()
-        with __.div(klass="section-group"):
+        __ = HtmlWriter()
+        with __.open("div", klass="section-group"):
             if not fragment and not preview:
-                with __.div(klass="left-margin"):
-                    with __.div(klass="sticky-buttons nav-buttons"):
-                        __(side_button(name="Home", icon="home", href="/"))
-            with __.div(klass="section-list"):
-                with __.div(klass="section-item"):
-                    with __.div(klass="section-content"):
+                with __.open("div", klass="left-margin"):
+                    with __.open("div", klass="sticky-buttons nav-buttons"):
+                        __(HOME_BUTTON)
+            with __.open("div", klass="section-list"):
+                with __.open("div", klass="section-item"):
+                    with __.open("div", klass="section-content"):
                         __(self.make_title_card())
                     if not fragment and not preview:
-                        with __.div(klass="right-margin"):
-                            with __.div(klass="sticky-buttons option-buttons"):
-                                __(
-                                    side_button(
-                                        name="Dark",
-                                        icon="adjust",
-                                        _klass="theme-button",
-                                    )
-                                )
-                                __(
-                                    side_button(
-                                        name="Full",
-                                        icon="expand",
-                                        _klass="fullscreen-button",
-                                    )
-                                )
+                        with __.open("div", klass="right-margin"):
+                            with __.open("div", klass="sticky-buttons option-buttons"):
+                                __(THEME_BUTTON)
+                                __(FULLSCREEN_BUTTON)
         return __
 
-    def make_sections(self, html_parts, fragment, preview) -> Airium:
+    def make_sections(self, __, parts, fragment, preview):
         """
-        Create main body of document, with sticky navigation.
+        Write the main body of the document, with sticky navigation; yield
+        after each section (starting with the index) is written.
         """
-        __ = Airium()
-        with __.div(klass="section-group"):
+        with __.open("div", klass="section-group"):
             if not fragment and not preview:
-                with __.div(klass="left-margin"):
-                    with __.div(klass="sticky-buttons"):
-                        __(
-                            side_button(
-                                name="Menu", icon="bars", _klass="navigation-button"
-                            )
-                        )
-            with __.div(klass="section-list"):
-                if "index" in html_parts:
-                    with __.div(klass="section-item"):
-                        with __.div(klass="section-content"):
-                            __(html_parts["index"])
+                with __.open("div", klass="left-margin"):
+                    with __.open("div", klass="sticky-buttons"):
+                        __(MENU_BUTTON)
+            with __.open("div", klass="section-list"):
+                if "index" in parts:
+                    index_html = self.make_index(parts)
+                    index_html = self.replace_placeholders("index", index_html)
+                    with __.open("div", klass="section-item"):
+                        with __.open("div", klass="section-content"):
+                            __(index_html)
                         if not fragment and not preview:
-                            with __.div(klass="right-margin"):
-                                with __.div(klass="sticky-buttons"):
+                            with __.open("div", klass="right-margin"):
+                                with __.open("div", klass="sticky-buttons"):
                                     link = self.settings.get_base_uri(
                                         "edit", "index", relative=True
                                     )
@@ -278,14 +333,18 @@ class Wiki(object):
                                             name="Edit", icon="pencil", href=link
                                         )
                                     )
+                    yield
                 for numbering, _slug, _, _, _ in self.outline:
-                    if _slug in html_parts and _slug not in ["index", "biblio"]:
-                        with __.div(klass="section-item"):
-                            with __.div(klass="section-content"):
-                                __(html_parts[_slug])
+                    if _slug in parts and _slug not in ["index", "biblio"]:
+                        html = self.finish_section(
+                            numbering, _slug, parts[_slug], fragment, preview
+                        )
+                        with __.open("div", klass="section-item"):
+                            with __.open("div", klass="section-content"):
+                                __(html)
                             if not fragment and not preview:
-                                with __.div(klass="right-margin"):
-                                    with __.div(klass="sticky-buttons"):
+                                with __.open("div", klass="right-margin"):
+                                    with __.open("div", klass="sticky-buttons"):
                                         label = "§" + "<wbr/>.".join(numbering)
                                         link = self.settings.get_base_uri(
                                             "edit", _slug, relative=True
@@ -295,15 +354,17 @@ class Wiki(object):
                                                 name=label, icon="pencil", href=link
                                             )
                                         )
+                        yield
 
                 biblio_html = self.bibliography.html()
+                self.add_bibliography_dependencies(parts)
                 if biblio_html != "":
-                    with __.div(klass="section-item"):
-                        with __.div(klass="section-content"):
+                    with __.open("div", klass="section-item"):
+                        with __.open("div", klass="section-content"):
                             __(biblio_html)
-                        with __.div(klass="right-margin"):
+                        with __.open("div", klass="right-margin"):
                             if not fragment and not preview:
-                                with __.div(klass="sticky-buttons"):
+                                with __.open("div", klass="sticky-buttons"):
                                     link = self.settings.get_base_uri(
                                         "edit", "biblio", relative=True
                                     )
@@ -313,25 +374,38 @@ class Wiki(object):
                                         )
                                     )
 
-        return __
+        yield
+
+    def add_bibliography_dependencies(self, parts):
+        """
+        The bibliography collects entries and citations from every part, so
+        record what its HTML was made from.
+        """
+        self.dependencies.source(
+            "biblio", [], parts.get("biblio", ""), self.settings.fingerprint()
+        )
+        self.dependencies.add("biblio", "entries", "", self.bibliography.entries)
+        self.dependencies.add("biblio", "citations", "", self.bibliography.citations)
+        self.dependencies.add("biblio", "outline", "", self.outline.single_page())
 
-    def make_plugin_footer(self, plugin):
-        __ = Airium()
+    def make_plugin_footer(self, plugin) -> HtmlWriter:
+        __ = HtmlWriter()
         title, html = plugin.hook_add_end_section()
+        self.dependencies.add("plugins", "footer", title, html)
         if html != "":
-            with __.section(klass="body depth-1"):
-                with __.div(klass="section-group"):
-                    __.div(klass="left-margin")
-                    with __.div(klass="section-list"):
-                        with __.div(klass="section-item"):
-                            with __.div(klass="section-content"):
+            with __.open("section", klass="body depth-1"):
+                with __.open("div", klass="section-group"):
+                    __.tag("div", klass="left-margin")
+                    with __.open("div", klass="section-list"):
+                        with __.open("div", klass="section-item"):
+                            with __.open("div", klass="section-content"):
                                 __(section_heading(title, None, title))
-                                with __.div(klass="columns-x2 compact"):
+                                with __.open("div", klass="columns-x2 compact"):
                                     __(html)
-                            __.div(klass="right-margin")
+                            __.tag("div", klass="right-margin")
         return __
 
-    def make_title_card(self) -> Airium:
+    def make_title_card(self) -> HtmlWriter:
         """
         Format the document header.
 
@@ -355,26 +429,27 @@ class Wiki(object):
         except ValueError:
             date_yyyymmdd = None
 
-        __ = Airium()
-        with __.header(klass="titles"):
-            inline = Inline()
-            with __.hgroup():
+        __ = HtmlWriter()
+        with __.open("header", klass="titles"):
+            inline = get_inline()
+            with __.open("hgroup"):
                 if title != "":
-                    __.h1(klass="balance-text", _t=inline.process(title))
+                    __.tag("h1", inline.process(title), klass="balance-text")
                 if subtitle != "":
-                    __.h2(klass="balance-text", _t=inline.process(subtitle))
+                    __.tag("h2", inline.process(subtitle), klass="balance-text")
             if author != "" or email != "":
-                with __.div(klass="author-list"):
-                    with __.address():
-                        __.div(_t=inline.process(author))
-                        __.div(_t=inline.process(email))
+                with __.open("div", klass="author-list"):
+                    with __.open("address"):
+                        __.tag("div", inline.process(author))
+                        __.tag("div", inline.process(email))
             if date_str != "":
                 if date_yyyymmdd is not None:
-                    with __.p(klass="space", rel="date"):
-                        __.time(
+                    with __.open("p", klass="space", rel="date"):
+                        __.tag(
+                            "time",
+                            inline.process(date_str),
                             pubdate=None,
                             datetime=date_yyyymmdd,
-                            _t=inline.process(date_str),
                         )
                 else:
                     __(inline.process(date_str))
@@ -424,10 +499,19 @@ class Wiki(object):
         Front matter: index text and table of contents (from outline)
         """
         text = parts["index"]
-        content, _ = split_bibliography(text)
-        blocks = BlockList(content)
-        title, summary = blocks.pop_titles()
-        content_html = blocks.html(["0"], "index", self.settings, fragment=True)
+        self.dependencies.source(
+            "index", ["0"], self.sources.get("index"), self.settings.fingerprint()
+        )
+        for element in self.outline:
+            self.dependencies.add("index", "outline", element[1], element)
+        for _slug in parts:
+            self.dependencies.add("index", "part", _slug)
+        with self.profile.stage("blocks"):
+            content, _ = split_bibliography(text)
+            blocks = BlockList(content)
+            title, summary = blocks.pop_titles()
+            content_html = blocks.html(["0"], "index", self.settings, fragment=True)
+        self.profile.count("blocks", len(blocks.blocks))
         if not self.outline.single_page():
             edit_base_uri = self.settings.get_base_uri("edit", relative=True)
             content_html += self.outline.html(edit_base_uri)
@@ -438,22 +522,55 @@ class Wiki(object):
         """
         Wrap section HTML in titles and nav.
         Pre-format header and footer dividers.
-        """
-
-        content, _ = split_bibliography(text)
 
-        blocks = BlockList(content)
-        content_html = blocks.html(
-            numbering, slug, self.settings, fragment, preview, self.plugins
+        Sections are cached on their source text, placeholder text, position,
+        and the settings in effect; rendering can also change settings (e.g.
+        $[COUNTER++]), so store the settings that result and replay them.
+        Placeholders are replaced afterwards, so cross-references, citations,
+        etc, are always current.
+        """
+        key = content_key(
+            "section",
+            numbering,
+            slug,
+            self.sources.get(slug),
+            text,
+            fragment,
+            preview,
+            self.settings.fingerprint(),
+        )
+        self.dependencies.source(
+            slug, numbering, self.sources.get(slug), self.settings.fingerprint()
         )
 
-        __ = Airium()
-        with __.section(
-            id=".".join(numbering) + "_" + slug, klass=f"body depth-{len(numbering)}"
+        cached = SECTION_CACHE.get(key)
+        if cached is not None:
+            section_html, settings_after = cached
+            self.settings.update(settings_after)
+            self.profile.count("cached_sections")
+            return section_html
+
+        with self.profile.stage("blocks"):
+            content, _ = split_bibliography(text)
+            blocks = BlockList(content)
+            content_html = blocks.html(
+                numbering, slug, self.settings, fragment, preview, self.plugins
+            )
+        self.profile.count("blocks", len(blocks.blocks))
+
+        __ = HtmlWriter()
+        with __.open(
+            "section",
+            id=".".join(numbering) + "_" + slug,
+            klass=f"body depth-{len(numbering)}",
         ):
-            with __.div(klass="section-content"):
+            with __.open("div", klass="section-content"):
                 __(content_html)
-        return str(__)
+        section_html = str(__)
+
+        if blocks.cacheable():
+            SECTION_CACHE.set(key, (section_html, self.settings.snapshot()))
+        return section_html
 
 
 # ------------------------------
@@ -523,15 +640,17 @@ class Demo(object):
         Config.delimiters
     )
 
-    def __init__(self, settings=None):
+    def __init__(self, settings=None, profile=None):
         "Just a thin wrapper for Placeholders; parse options in replace()."
         self.placeholders = Placeholders(self.regex, "demo")
+        self.profile = profile or RenderProfile()
+        self.seen = {}  # <-- {digest: count}, for repeated DEMO blocks
         if settings:
             self.settings = settings.copy()
         else:
             self.settings = Settings()
             self.settings.set("config:user", "_")
-            self.settings.set("config:document", random_slug("demo"))
+            self.settings.set("config:document", "demo")
 
     def insert(self, parts):
         "Add placeholders."
@@ -540,26 +659,45 @@ class Demo(object):
     def decorate(self, pattern, part_slug):
         """
         When we process a new demo block it needs to be assigned a unique
-        id_prefix as its config:document name. Micro chance of a collision;
-        maybe replace with a singleton to track random IDs in use.
+        id_prefix as its config:document name. This is a hash of its source
+        and options (plus a count, if the same block is repeated), so that
+        the output can be cached like a section.
         """
-        self.settings.set("config:document", random_slug("demo"))
-
-        wiki = Wiki(self.settings)
         options = match_demo_options(pattern)
-        fragment = "index" not in options
-        preview = True
-        part_slug = "index" if "index" in options else random_slug("demo-")
         lines = pattern.splitlines()
-        class_name = "wiki-demo-wide" if "wide" in options else "wiki-demo"
         source = "\n".join(lines[1:-1])
-        output = wiki.process(None, None, {part_slug: source}, fragment, preview)
+        digest = content_key("demo", source, options)[:12]
+        count = self.seen.get(digest, 0)
+        self.seen[digest] = count + 1
+        suffix = "_%d" % count if count else ""
+        demo_id = "demo_" + digest + suffix
+
+        self.settings.set("config:document", demo_id)
+        key = content_key("demo", source, options, self.settings.fingerprint())
+        cached = DEMO_CACHE.get(key)
+        if cached is not None:
+            output, settings_after = cached
+            self.settings.update(settings_after)
+            self.profile.count("cached_demos")
+        else:
+            wiki = Wiki(self.settings)
+            fragment = "index" not in options
+            preview = True
+            demo_slug = "index" if "index" in options else "demo-" + digest + suffix
+            with self.profile.stage("demo"):
+                output = wiki.process(
+                    None, None, {demo_slug: source}, fragment, preview
+                )
+            self.profile.count("demos")
+            if BlockList(source).cacheable():
+                DEMO_CACHE.set(key, (output, self.settings.snapshot()))
 
-        __ = Airium()
-        with __.div(klass=class_name):
-            with __.div(klass="wiki-demo-input"):
-                __.pre(_t=escape(source))
-            with __.div(klass="wiki-demo-output"):
+        class_name = "wiki-demo-wide" if "wide" in options else "wiki-demo"
+        __ = HtmlWriter()
+        with __.open("div", klass=class_name):
+            with __.open("div", klass="wiki-demo-input"):
+                __.tag("pre", escape(source))
+            with __.open("div", klass="wiki-demo-output"):
                 __(output)
         return str(__)
 
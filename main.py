@@ -36,6 +36,7 @@ table of contents.
 - Admin
 
 @app.get('/admin') -- Administrative options:
+@app.get('/admin/renders') -- Slowest recent renders, as JSON
 @app.post('/admin/initialize') -- Load pages from install/articles directory
 @app.post('/admin/regenerate') -- Regenerate all pages/metadata, cache them
 @app.get('/admin/import-archive/{user_slug}') -- Show upload form
@@ -75,16 +76,25 @@ import os
 import shutil
 import sys
 import tempfile
+from contextlib import asynccontextmanager
 from copy import copy
 from datetime import datetime
+from itertools import chain
 from typing import Annotated
 from urllib.parse import unquote_plus, urljoin
 
+import anyio
 import uvicorn
 from cachetools.func import ttl_cache
 from fastapi import Depends, FastAPI, Form, HTTPException, Request, UploadFile, status
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, Response
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from jinja2 import Environment as JinjaTemplates
 from jinja2 import PackageLoader
@@ -94,33 +104,54 @@ from PIL import Image, ImageDraw
 from command import initialize, refresh_metadata
 from lib.archive import make_zip_data
 from lib.bokeh import make_background
-from lib.data import Data, RedisTimer, load_env_config
+from lib.data import RedisTimer, get_data, load_env_config
 from lib.document import PROTECTED_DOC_SLUGS, Document
-from lib.ebook import write_epub
-from lib.login import Login
+from lib.jobs import request_epub, start_epub_worker
+from lib.login import Login, forget_session
 from lib.overlay import make_card, make_cover, make_quote
 from lib.rss import rss_xml
 from lib.slugs import slug
 from lib.sparkline import svg_sparkline
 from lib.storage import make_zip_name, read_archive_dir, uncompress_archive_dir
 from lib.wiki.blocks import get_title_data
+from lib.wiki.profile import RENDER_LOG
 from lib.wiki.settings import Settings
 from lib.wiki.utils import trim
 from lib.wiki.wiki import Wiki, clean_text, is_index_part, reformat_part
 
 CONFIG = load_env_config()
 
+RENDER_LOGGER = logging.getLogger("uvicorn.error")  # <-- Logs at INFO under uvicorn
 
 if "pytest" in sys.modules:
     logging.info("Running in PyTest: Reconfiguring to use test database.")
     CONFIG["REDIS_DATABASE"] = CONFIG["REDIS_TEST_DATABASE"]
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Size the thread pool that runs blocking handlers (rendering, Redis), and
+    run an ebook worker alongside the app, unless EPUB_WORKER=NO (e.g. when
+    running `python command.py epub-worker` separately).
+    """
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = int(CONFIG["RENDER_THREADS"])
+
+    worker = None
+    if CONFIG["EPUB_WORKER"] == "YES":
+        worker, stop = start_epub_worker(CONFIG)
+    yield
+    if worker:
+        stop.set()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # Redis, Jinja
-data = Data(CONFIG)
+data = get_data(CONFIG)
 views = JinjaTemplates(
     loader=PackageLoader("main", "views"),
     trim_blocks=True,
@@ -234,6 +265,7 @@ def show_editor(
         fragment=False,
         preview=True,
     )
+    RENDER_LOG.add(user_slug, doc_slug, wiki.profile)
 
     template = views.get_template("editor.html")
     html = template.render(
@@ -269,7 +301,7 @@ async def login_form():
 
 
 @app.post("/login")
-async def do_login(
+def do_login(
     username: FormDependency,
     password: FormDependency,
 ):
@@ -306,7 +338,7 @@ async def do_login(
 
 
 @app.get("/logout")
-async def do_logout(request: Request):
+def do_logout(request: Request):
     """
     Destroy redis record for user login, and delete cookie.
     """
@@ -314,6 +346,7 @@ async def do_logout(request: Request):
     token = request.cookies.get("token", None)
     if token:
         data.login_delete(token)
+        forget_session(token)
         response.delete_cookie(key="token")
     return response
 
@@ -398,19 +431,20 @@ async def help():
 
 
 @app.get("/read/{user_slug}/{doc_slug}")
-async def read_document(user_slug, doc_slug, request: Request):
+def read_document(user_slug, doc_slug, request: Request):
     """
-    Compile the complete html document.
+    Compile the complete html document. If it isn't cached, stream it, so the
+    page head and title card are sent before the sections are rendered.
     """
-    with RedisTimer(data, user_slug, doc_slug, "read"):
-        page_html = generate_html_document(user_slug, doc_slug, request)
-    return HTMLResponse(content=page_html)
-
+    metadata = data.userDocumentMetadata_get(user_slug, doc_slug)
+    html = data.userDocumentCache_get(user_slug, doc_slug)
+    if html and metadata:
+        with RedisTimer(data, user_slug, doc_slug, "read"):
+            page_html = generate_html_page(user_slug, doc_slug, metadata, html, request)
+        headers = {"Server-Timing": 'cache;desc="hit"'}
+        return HTMLResponse(content=page_html, headers=headers)
 
-def generate_html_document(user_slug, doc_slug, request):
-    """
-    Cacheable page generator.
-    """
+    doc_parts = require_document(user_slug, doc_slug)  # <-- 404 before streaming
     settings = Settings(
         {
             "config:host": str(request.base_url),
@@ -418,18 +452,57 @@ def generate_html_document(user_slug, doc_slug, request):
             "config:document": doc_slug,
         }
     )
+    wiki = Wiki(settings)
+    pieces = stream_html_document(wiki, user_slug, doc_slug, doc_parts, request)
+    first = next(pieces)  # <-- Page head and title card
 
-    metadata = data.userDocumentMetadata_get(user_slug, doc_slug)
-    html = data.userDocumentCache_get(user_slug, doc_slug)
-    if not html or not metadata:
-        wiki = Wiki(settings)
-        doc_parts = require_document(user_slug, doc_slug)
-        html = wiki.process(user_slug, doc_slug, doc_parts)
-        data.userDocumentCache_set(user_slug, doc_slug, html)
+    # The headers go before the sections are rendered, so Server-Timing only
+    # has the stages done so far; the complete timings are logged when the
+    # render finishes (and listed at /admin/renders).
+    timings = wiki.profile.server_timing()
+    headers = {"Server-Timing": 'cache;desc="miss", ' + timings}
+    content = chain([first], pieces)
+    return StreamingResponse(content, media_type="text/html", headers=headers)
+
+
+CONTENT_MARKER = "<!-- content_html -->"
+
+
+def stream_html_document(wiki, user_slug, doc_slug, doc_parts, request):
+    """
+    Yield the page in pieces as the wiki renders it; when it is complete, cache
+    the document html and metadata, and log the render profile (with all of
+    its stages, unlike the Server-Timing header).
+    """
+    with RedisTimer(data, user_slug, doc_slug, "read") as timer:
+        pieces = wiki.stream(user_slug, doc_slug, doc_parts)
+        content = [next(pieces)]  # <-- Header; the title and outline are known
+        metadata = wiki.compile_metadata(CONFIG["TIME_ZONE"], user_slug, doc_slug)
+        page_html = generate_html_page(
+            user_slug, doc_slug, metadata, CONTENT_MARKER, request
+        )
+        head, _, tail = page_html.partition(CONTENT_MARKER)
+        with timer.pause():  # <-- Time the render, not the client
+            yield head + content[0]
+        for piece in pieces:
+            content.append(piece)
+            with timer.pause():
+                yield piece
+
+        data.userDocumentCache_set(user_slug, doc_slug, "".join(content))
         metadata = wiki.compile_metadata(CONFIG["TIME_ZONE"], user_slug, doc_slug)
         metadata["url"] = "/read/{:s}/{:s}".format(user_slug, doc_slug)
         data.userDocumentMetadata_set(user_slug, doc_slug, metadata)
+        RENDER_LOG.add(user_slug, doc_slug, wiki.profile)
+        timings = wiki.profile.server_timing()
+        RENDER_LOGGER.info(f"Rendered {user_slug}/{doc_slug}: {timings}")
+    yield tail
 
+
+def generate_html_page(user_slug, doc_slug, metadata, html, request):
+    """
+    Wrap document html in the read.html page.
+    """
     uri = "/read/{:s}/{:s}".format(user_slug, doc_slug)
     metadata["url"] = urljoin(str(request.base_url), uri)
     author_uri = "/read/{:s}".format(user_slug)
@@ -441,12 +514,11 @@ def generate_html_document(user_slug, doc_slug, request):
     template = views.get_template("read.html")
     template.trim_blocks = True
     template.lstrip_blocks = True
-    page_html = template.render(config=CONFIG, metadata=metadata, content_html=html)
-    return page_html
+    return template.render(config=CONFIG, metadata=metadata, content_html=html)
 
 
 @app.get("/rss/{user_slug}.xml")
-async def rss_latest(user_slug, request: Request):
+def rss_latest(user_slug, request: Request):
     """
     Generate Really Simple Syndication data for recently edited files.
     """
@@ -492,7 +564,7 @@ async def new_article(
 
 
 @app.get("/edit/{user_slug}/{doc_slug}/{part_slug}")
-async def edit_part(
+def edit_part(
     user_slug,
     doc_slug,
     login: LoginDependency,
@@ -594,7 +666,7 @@ async def edit_part(
 
 
 @app.post("/edit/{user_slug}/{doc_slug}/{part_slug}")
-async def post_edit_part(
+def post_edit_part(
     user_slug: str,
     doc_slug: str,
     part_slug: str,
@@ -753,7 +825,7 @@ def editor_post(
 
 
 @app.get("/delete/{user_slug}/{doc_slug}/{part_slug}")
-async def delete_part(
+def delete_part(
     user_slug: str,
     doc_slug: str,
     part_slug: str,
@@ -800,8 +872,21 @@ async def admin(
     return HTMLResponse(content=html)
 
 
+@app.get("/admin/renders")
+async def admin_renders(
+    login: LoginDependency,
+    limit: int = 20,
+):
+    """
+    List the slowest recent renders in this process, with their stage timings
+    and counts (see lib/wiki/profile.py).
+    """
+    login.require_admin()
+    return RENDER_LOG.slowest(limit)
+
+
 @app.post("/admin/initialize")
-async def admin_initialize(
+def admin_initialize(
     login: LoginDependency,
 ):
     """
@@ -813,7 +898,7 @@ async def admin_initialize(
 
 
 @app.post("/admin/refresh")
-async def admin_refresh(
+def admin_refresh(
     login: LoginDependency,
 ):
     """
@@ -830,7 +915,7 @@ async def admin_refresh(
 
 
 @app.get("/download/{user_slug}/{doc_slug}")
-async def download_txt(user_slug, doc_slug, request: Request):
+def download_txt(user_slug, doc_slug, request: Request):
     """
     Creates a single text file to download.
     """
@@ -865,7 +950,7 @@ async def upload_txt_form(
 
 
 @app.post("/upload/{user_slug}/{doc_slug}")
-async def post_upload_txt(
+def post_upload_txt(
     user_slug,
     doc_slug,
     upload: UploadFile,
@@ -889,7 +974,7 @@ async def post_upload_txt(
         msg = f"Filename must start with '{prefix}' and end with '{suffix}'"
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=msg)
 
-    file_bytes = await upload.read()
+    file_bytes = upload.file.read()
     file_text = file_bytes.decode("utf-8")
 
     document = Document(data)
@@ -903,7 +988,7 @@ async def post_upload_txt(
 
 
 @app.get("/export-archive/{user_slug}")
-async def export_archive(user_slug):
+def export_archive(user_slug):
     """
     Downloads an export_archive file.
     - Anyone can do this
@@ -938,7 +1023,7 @@ async def import_archive_form(
 
 
 @app.post("/import-archive/{user_slug}")
-async def post_import_archive(
+def post_import_archive(
     user_slug,
     upload: UploadFile,
     request: Request,
@@ -1007,7 +1092,7 @@ async def post_import_archive(
 
 
 @app.get("/sparkline/{user_slug}/{doc_slug}.svg")
-async def generate_svg_sparkline(user_slug: str, doc_slug: str):
+def generate_svg_sparkline(user_slug: str, doc_slug: str):
     """
     if our Redis has its time-series module enabled, then show a sparkline of
     recent access.
@@ -1017,11 +1102,11 @@ async def generate_svg_sparkline(user_slug: str, doc_slug: str):
 
 
 @app.get("/epub/{user_slug}/{doc_slug}")
-async def generate_epub(user_slug, doc_slug):
+def generate_epub(user_slug, doc_slug):
     """
-    Generates, caches and downloads an .epub; use a 'generating' notice to say
-    reload the page in 5s; uses a simple redis lock or queue to show a 'reload
-    in 5s' note.
+    Downloads a cached .epub; otherwise queues it to be generated (see
+    lib/jobs.py) and shows a 'reload in 5s' notice. Repeated requests while
+    generating don't queue it again, nor do requests soon after it failed.
     """
 
     file_name = "%s_%s.epub" % (user_slug, doc_slug)
@@ -1042,47 +1127,18 @@ async def generate_epub(user_slug, doc_slug):
             msg = "Temporary error generating ebook"
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=msg)
 
-    elif data.epubCachePlaceholder_exists(user_slug, doc_slug):
+    elif data.epubFailure_exists(user_slug, doc_slug):
+        msg = "Download failed"
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=msg)
+
+    else:
+        require_document(user_slug, doc_slug)
+        request_epub(data, user_slug, doc_slug)  # <-- Unless already queued
         reload_html = views.get_template("reload.html").render(
             config=CONFIG, user_slug=user_slug, doc_slug=doc_slug, title="Generating..."
         )
         return HTMLResponse(content=reload_html, status_code=status.HTTP_202_ACCEPTED)
 
-    else:
-        # Generate and cache; requests for a lot of simultaneous
-        # books that must all be generated could slow this down; add
-        # a job queue later if that becomes necessary.
-
-        data.epubCachePlaceholder_set(user_slug, doc_slug)  # with expiry
-
-        file_path = os.path.join("/tmp", file_name)
-        write_epub(user_slug, doc_slug, file_path)
-
-        if os.path.exists(file_path):
-            with open(file_path, "rb") as f:
-                content = f.read()
-        else:
-            logging.error("Download failed: " + file_path)
-            msg = "Download failed"
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=msg)
-
-        data.epubCache_set(user_slug, doc_slug, content)
-        data.epubCachePlaceholder_delete(user_slug, doc_slug)
-
-        try:
-            zip_data = data.epubCache_get(user_slug, doc_slug)
-            zip_data_type = "application/epub+zip"
-            zip_data_headers = {
-                "Content-Disposition": f'inline; filename="{file_name}"'
-            }
-            return Response(
-                content=zip_data, media_type=zip_data_type, headers=zip_data_headers
-            )
-        except Exception:
-            data.epubCache_delete(user_slug, doc_slug)  # <-- Not right, rm
-            msg = "Temporary error generating ebook"
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=msg)
-
 
 COVER_DIMENSIONS = (1600, 2200)
 MEDIA_DIMENSIONS = (1200, 630)